@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+"""
+Local SQLite mirror of the discovery queue
+
+Keeps an indexed copy of discovered_listings and normalized_listings so queue
+stats, backfill selection and coverage reports don't need a full REST scan.
+Each sync only pulls rows whose watermark columns moved past the last synced
+(value, id) pair. Unless told not to, it then re-checks the rows still
+pending locally, because status-only updates such as research_failed move no
+watermark and rows deleted remotely never show up in a delta. That check
+costs one request per 100 pending rows, so callers syncing repeatedly
+within a run reconcile only once.
+
+Usage:
+    python3 scripts/discovery_mirror.py sync [--full]
+    python3 scripts/discovery_mirror.py stats
+    python3 scripts/discovery_mirror.py coverage
+    python3 scripts/discovery_mirror.py next [--limit N]
+"""
+
+import json
+import os
+import sqlite3
+import sys
+import time
+
+import requests
+
+from discovery_research import SUPABASE_URL, headers
+
+DEFAULT_PATH = os.getenv(
+    "DISCOVERY_MIRROR_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "discovery_mirror.db")
+)
+
+PAGE_SIZE = 1000
+RECONCILE_CHUNK = 100  # ids per id=in.(...) request; keeps the URL well under server limits
+
+# Columns that advance whenever a row is inserted or changes state. The first
+# column drives the initial full copy; the rest pick up status transitions
+# (discovered_listings has no updated_at).
+WATERMARKS = {
+    "discovered_listings": ["created_at", "researched_at", "last_enrichment_attempt", "published_at"],
+    "normalized_listings": ["updated_at"],
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS discovered_listings (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    type TEXT,
+    city TEXT,
+    state TEXT,
+    status TEXT,
+    engagement_score REAL,
+    listing_id TEXT,
+    created_at TEXT,
+    row TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_discovered_status_engagement
+    ON discovered_listings(status, engagement_score DESC);
+CREATE INDEX IF NOT EXISTS idx_discovered_city_type
+    ON discovered_listings(city, type);
+
+CREATE TABLE IF NOT EXISTS normalized_listings (
+    id TEXT PRIMARY KEY,
+    city TEXT,
+    category TEXT,
+    updated_at TEXT,
+    row TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_normalized_city_category
+    ON normalized_listings(city, category);
+
+CREATE TABLE IF NOT EXISTS sync_state (
+    table_name TEXT NOT NULL,
+    column_name TEXT NOT NULL,
+    value TEXT NOT NULL,
+    last_id TEXT NOT NULL,
+    PRIMARY KEY (table_name, column_name)
+);
+"""
+
+
+def connect(path=DEFAULT_PATH):
+    """Open (and create if needed) the mirror database"""
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _store(conn, table, row):
+    """Upsert one REST row into its mirror table"""
+    if table == "discovered_listings":
+        conn.execute(
+            """INSERT OR REPLACE INTO discovered_listings
+               (id, name, type, city, state, status, engagement_score, listing_id, created_at, row)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                row["id"], row.get("name"), row.get("service_type") or row.get("type"),
+                row.get("city"), row.get("state"), row.get("status"),
+                float(row.get("engagement_score") or 0), row.get("listing_id"),
+                row.get("created_at"), json.dumps(row)
+            )
+        )
+    else:
+        location_data = row.get("location_data") or {}
+        conn.execute(
+            """INSERT OR REPLACE INTO normalized_listings (id, city, category, updated_at, row)
+               VALUES (?, ?, ?, ?, ?)""",
+            (
+                row["id"], location_data.get("city") or row.get("city"), row.get("category"),
+                row.get("updated_at"), json.dumps(row)
+            )
+        )
+
+
+def _get_watermark(conn, table, column):
+    row = conn.execute(
+        "SELECT value, last_id FROM sync_state WHERE table_name = ? AND column_name = ?",
+        (table, column)
+    ).fetchone()
+    return (row["value"], row["last_id"]) if row else None
+
+
+def _set_watermark(conn, table, column, value, last_id):
+    conn.execute(
+        "INSERT OR REPLACE INTO sync_state (table_name, column_name, value, last_id) VALUES (?, ?, ?, ?)",
+        (table, column, value, last_id)
+    )
+
+
+def _sync_column(session, conn, table, column):
+    """Page through rows past the (column, id) watermark in keyset order"""
+    fetched = 0
+    watermark = _get_watermark(conn, table, column)
+
+    while True:
+        params = {
+            "select": "*",
+            "order": f"{column}.asc,id.asc",
+            "limit": PAGE_SIZE,
+            column: "not.is.null",
+        }
+        if watermark:
+            value, last_id = watermark
+            params["or"] = f'({column}.gt."{value}",and({column}.eq."{value}",id.gt.{last_id}))'
+
+        response = session.get(f"{SUPABASE_URL}/rest/v1/{table}", headers=headers, params=params, timeout=60)
+        if response.status_code != 200:
+            raise Exception(f"HTTP {response.status_code} syncing {table}.{column}: {response.text}")
+
+        rows = response.json()
+        for row in rows:
+            _store(conn, table, row)
+
+        if rows:
+            watermark = (rows[-1][column], rows[-1]["id"])
+            _set_watermark(conn, table, column, *watermark)
+            conn.commit()
+            fetched += len(rows)
+
+        if len(rows) < PAGE_SIZE:
+            return fetched
+
+
+def _reconcile_pending(session, conn):
+    """
+    Re-check the rows the mirror still holds as pending_research, returning
+    (status changes applied, rows deleted)
+
+    Some status changes (research_failed, ignored) only set status, which
+    none of the watermark columns see, so without this they stay pending
+    locally forever. Rows missing from the response were deleted remotely
+    (e.g. by scripts/clear-database.ts) and are deleted locally too, so they
+    are never researched again. Only id and status are fetched.
+    """
+    ids = [r["id"] for r in conn.execute("SELECT id FROM discovered_listings WHERE status = 'pending_research'")]
+    changed = 0
+    deleted = 0
+
+    for start in range(0, len(ids), RECONCILE_CHUNK):
+        chunk = ids[start:start + RECONCILE_CHUNK]
+        response = session.get(
+            f"{SUPABASE_URL}/rest/v1/discovered_listings",
+            headers=headers,
+            params={"select": "id,status", "id": f"in.({','.join(chunk)})"},
+            timeout=60
+        )
+        if response.status_code != 200:
+            raise Exception(f"HTTP {response.status_code} reconciling discovered_listings: {response.text}")
+
+        remaining = set(chunk)
+        for row in response.json():
+            remaining.discard(row["id"])
+            if row["status"] != "pending_research":
+                mark_status(conn, row["id"], status=row["status"], commit=False)
+                changed += 1
+        for discovery_id in remaining:
+            conn.execute("DELETE FROM discovered_listings WHERE id = ?", (discovery_id,))
+        deleted += len(remaining)
+        conn.commit()
+
+    return changed, deleted
+
+
+def sync(conn, full=False, reconcile=True):
+    """
+    Pull new and changed rows into the mirror
+
+    Args:
+        conn: Mirror connection from connect()
+        full: Drop all local rows and watermarks and copy everything again
+        reconcile: Re-check locally pending rows against Supabase; pass
+              False for repeated delta syncs within a run
+
+    Returns:
+        Dict of table name -> rows fetched, plus "reconciled": pending rows
+        whose status had changed remotely and "deleted": pending rows that
+        no longer exist remotely (both only when reconciling)
+    """
+    if full:
+        for table in WATERMARKS:
+            conn.execute(f"DELETE FROM {table}")
+        conn.execute("DELETE FROM sync_state")
+        conn.commit()
+
+    session = requests.Session()
+    counts = {}
+
+    for table, columns in WATERMARKS.items():
+        initial = _get_watermark(conn, table, columns[0]) is None
+        counts[table] = _sync_column(session, conn, table, columns[0])
+
+        for column in columns[1:]:
+            if initial and _get_watermark(conn, table, column) is None:
+                # The initial copy already holds every row, so start the
+                # secondary watermarks at the newest local value
+                latest = conn.execute(
+                    f"""SELECT json_extract(row, '$.{column}') AS value, id FROM {table}
+                        WHERE json_extract(row, '$.{column}') IS NOT NULL
+                        ORDER BY value DESC, id DESC LIMIT 1"""
+                ).fetchone()
+                if latest:
+                    _set_watermark(conn, table, column, latest["value"], latest["id"])
+                    conn.commit()
+                    continue
+            counts[table] += _sync_column(session, conn, table, column)
+
+    if reconcile:
+        counts["reconciled"], counts["deleted"] = _reconcile_pending(session, conn)
+    return counts
+
+
+def mark_status(conn, discovery_id, commit=True, **fields):
+    """Apply a status update we just PATCHed remotely to the local copy"""
+    row = conn.execute("SELECT row FROM discovered_listings WHERE id = ?", (discovery_id,)).fetchone()
+    if not row:
+        return
+    data = json.loads(row["row"])
+    data.update(fields)
+    _store(conn, "discovered_listings", data)
+    if commit:
+        conn.commit()
+
+
+def pending(conn, limit=None, since=None):
+    """Pending discoveries ordered by engagement, as REST-shaped dicts (only those created since an ISO time if given)"""
+    query = "SELECT row FROM discovered_listings WHERE status = 'pending_research'"
+    params = ()
+    if since:
+        query += " AND created_at >= ?"
+        params += (since,)
+    query += " ORDER BY engagement_score DESC"
+    if limit:
+        query += " LIMIT ?"
+        params += (limit,)
+    return [json.loads(r["row"]) for r in conn.execute(query, params)]
+
+
+def queue_stats(conn):
+    """Discovery counts by status"""
+    return {
+        r["status"] or "unknown": r["count"]
+        for r in conn.execute("SELECT status, COUNT(*) AS count FROM discovered_listings GROUP BY status")
+    }
+
+
+def total_listings(conn):
+    return conn.execute("SELECT COUNT(*) FROM normalized_listings").fetchone()[0]
+
+
+def coverage(conn):
+    """Per-city discovery and listing counts, least covered first"""
+    rows = conn.execute(
+        """SELECT d.city AS city,
+                  COUNT(*) AS discovered,
+                  SUM(d.status = 'pending_research') AS pending,
+                  SUM(d.status = 'researched') AS researched,
+                  COUNT(DISTINCT d.type) AS service_types,
+                  (SELECT COUNT(*) FROM normalized_listings n WHERE n.city = d.city) AS listings
+           FROM discovered_listings d
+           GROUP BY d.city
+           ORDER BY listings ASC, discovered ASC"""
+    )
+    return [dict(r) for r in rows]
+
+
+def main():
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    limit = None
+    for i, arg in enumerate(sys.argv):
+        if arg == "--limit" and i + 1 < len(sys.argv):
+            limit = int(sys.argv[i + 1])
+
+    conn = connect()
+
+    start = time.time()
+    counts = sync(conn, full="--full" in sys.argv)
+    print(f"🔄 Synced mirror in {time.time() - start:.2f}s ({', '.join(f'{t}: +{n}' for t, n in counts.items())})")
+    print()
+
+    if command == "stats":
+        stats = queue_stats(conn)
+        print("📊 Discovery Queue:")
+        print(f"   Pending: {stats.get('pending_research', 0)}")
+        print(f"   Researched: {stats.get('researched', 0)}")
+        print(f"   Failed: {stats.get('research_failed', 0)}")
+        print(f"\n🏆 Total Listings: {total_listings(conn)}")
+
+    elif command == "coverage":
+        print(f"{'City':<24}{'Discovered':>12}{'Pending':>10}{'Researched':>12}{'Types':>8}{'Listings':>10}")
+        for row in coverage(conn):
+            print(f"{(row['city'] or 'Unknown'):<24}{row['discovered']:>12}{row['pending']:>10}"
+                  f"{row['researched']:>12}{row['service_types']:>8}{row['listings']:>10}")
+
+    elif command == "next":
+        for discovery in pending(conn, limit or 20):
+            print(f"{discovery.get('engagement_score', 0)!s:>6}  {discovery.get('name')} ({discovery.get('city')})")
+
+    elif command != "sync":
+        print(f"Unknown command: {command}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
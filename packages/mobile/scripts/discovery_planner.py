@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Yield-aware task planner for comprehensive discovery
+
+Records how many new discoveries each (city, service) task returned and
+schedules the tasks expected to find the most new listings first.
+
+The expected yield is an exponentially time-decayed mean, shrunk towards an
+optimistic prior. Untried tasks start at the prior so they get explored,
+repeated empty calls pull a task below MIN_YIELD so it is skipped, and as old
+observations decay the estimate drifts back to the prior so saturated tasks
+are re-probed every few weeks.
+
+Usage:
+    python3 scripts/discovery_planner.py            # Show current estimates
+"""
+
+import json
+import os
+import sys
+import time
+
+DEFAULT_PATH = os.getenv(
+    "DISCOVERY_YIELD_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "discovery_yield.json")
+)
+
+PRIOR_YIELD = 5.0       # Expected new discoveries for a task never tried
+PRIOR_WEIGHT = 0.5      # How many observations the prior is worth
+HALF_LIFE_DAYS = 14.0   # Observation weight halves every two weeks
+MIN_YIELD = 0.5         # Tasks expected to find fewer than this are skipped
+
+
+def task_key(city, service_type):
+    return f"{city}|{service_type}"
+
+
+class DiscoveryPlanner:
+    def __init__(self, path=DEFAULT_PATH, prior=PRIOR_YIELD, prior_weight=PRIOR_WEIGHT,
+                 half_life_days=HALF_LIFE_DAYS, min_yield=MIN_YIELD):
+        self.path = path
+        self.prior = prior
+        self.prior_weight = prior_weight
+        self.half_life = half_life_days * 86400
+        self.min_yield = min_yield
+        self.stats = {}
+
+        if os.path.exists(path):
+            with open(path) as f:
+                self.stats = json.load(f)
+
+    def save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.stats, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+    def _decay(self, stat, now):
+        return 0.5 ** ((now - stat["last_called"]) / self.half_life)
+
+    def estimate(self, key, now=None):
+        """Expected new discoveries for the next call of a task"""
+        stat = self.stats.get(key)
+        if not stat:
+            return self.prior
+
+        decay = self._decay(stat, now or time.time())
+        weight = stat["weight"] * decay
+        total = stat["total"] * decay
+        return (total + self.prior * self.prior_weight) / (weight + self.prior_weight)
+
+    def record(self, key, new_discoveries, now=None):
+        """Fold the result of one call into the task's decayed mean"""
+        now = now or time.time()
+        stat = self.stats.get(key)
+
+        if stat:
+            decay = self._decay(stat, now)
+            stat["weight"] = stat["weight"] * decay + 1
+            stat["total"] = stat["total"] * decay + new_discoveries
+        else:
+            stat = self.stats[key] = {"weight": 1.0, "total": float(new_discoveries), "calls": 0}
+
+        stat["calls"] += 1
+        stat["last_called"] = now
+        stat["last_yield"] = new_discoveries
+
+    def plan(self, tasks, budget=None, now=None):
+        """
+        Order tasks by expected yield within a call budget
+
+        Args:
+            tasks: Task dicts with "city" and "service_type" keys
+            budget: Maximum number of calls to schedule (None = no limit)
+
+        Returns:
+            (scheduled tasks highest yield first, skipped exhausted tasks)
+        """
+        now = now or time.time()
+        scored = []
+        skipped = []
+
+        for i, task in enumerate(tasks):
+            expected = self.estimate(task_key(task["city"], task["service_type"]), now)
+            if expected < self.min_yield:
+                skipped.append(task)
+                continue
+            # Ties keep the caller's priority order
+            scored.append((-expected, i, {**task, "expected_yield": expected}))
+
+        scored.sort(key=lambda item: item[:2])
+        scheduled = [task for _, _, task in scored]
+
+        if budget is not None:
+            scheduled = scheduled[:budget]
+
+        return scheduled, skipped
+
+
+def main():
+    planner = DiscoveryPlanner()
+    if not planner.stats:
+        print("No yield history recorded yet")
+        sys.exit(0)
+
+    now = time.time()
+    rows = sorted(planner.stats.items(), key=lambda item: planner.estimate(item[0], now), reverse=True)
+
+    print(f"{'Task':<44}{'Expected':>10}{'Last':>6}{'Calls':>7}")
+    for key, stat in rows:
+        expected = planner.estimate(key, now)
+        marker = "" if expected >= planner.min_yield else "  (skipped)"
+        print(f"{key.replace('|', ' / '):<44}{expected:>10.2f}{stat['last_yield']:>6}{stat['calls']:>7}{marker}")
+
+
+if __name__ == "__main__":
+    main()
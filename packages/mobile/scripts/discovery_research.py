@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Research calls shared by backfill_discoveries.py and the pipelined mode of
+comprehensive_discovery.py
+
+Each discovery is researched through deep-research-venue (or a chunk of them
+through enrichment-venues-batch), then marked researched or research_failed. The Supabase URL and service role
+key come from the environment, for every script that imports them from here.
+"""
+
+import os
+import sys
+from datetime import datetime
+
+import requests
+
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SERVICE_ROLE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+if not SUPABASE_URL or not SERVICE_ROLE_KEY:
+    print("❌ Set SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY (scripts/setup-env.sh writes them to .env)")
+    sys.exit(1)
+
+headers = {
+    "apikey": SERVICE_ROLE_KEY,
+    "Authorization": f"Bearer {SERVICE_ROLE_KEY}",
+    "Content-Type": "application/json"
+}
+
+# Batch research outcomes (see research_batch)
+RESEARCHED = "researched"
+SKIPPED = "skipped"
+FAILED = "failed"
+UNKNOWN = "unknown"
+
+
+def research_payload(discovery):
+    location = discovery.get('location', 'Unknown')
+    city = discovery.get('city', 'Unknown')
+    return {
+        "venueName": discovery.get('name', 'Unknown'),
+        "location": f"{location}, {city}",
+        "city": city,
+        "state": discovery.get('state', 'Unknown'),
+        "serviceType": discovery.get('service_type') or 'venue',
+        "forceRefresh": False
+    }
+
+
+def research_single(discovery):
+    """Research one discovery via deep-research-venue, returning (listing, error)"""
+    try:
+        research_response = requests.post(
+            f"{SUPABASE_URL}/functions/v1/deep-research-venue",
+            headers=headers,
+            json=research_payload(discovery),
+            timeout=60
+        )
+
+        if research_response.status_code != 200:
+            raise Exception(f"HTTP {research_response.status_code}: {research_response.text}")
+
+        result = research_response.json()
+
+        if result.get('success'):
+            return result.get('listing', {}), None
+        return None, result.get('error', 'Unknown error')
+
+    except Exception as e:
+        return None, f"Error: {str(e)}"
+
+
+def research_batch(chunk, delay):
+    """
+    Research a chunk via enrichment-venues-batch, returning one
+    (outcome, listing, error) per discovery, where outcome is one of:
+
+      RESEARCHED  a listing was created
+      SKIPPED     a listing already exists, so there is nothing left to research
+      FAILED      research ran and failed for this discovery
+      UNKNOWN     the batch didn't report back (timeout, transport error or an
+                  error response); the function may still be creating listings,
+                  so these should be left pending and retried later
+
+    The function reports details in request order, so results are matched
+    back by position.
+    """
+    try:
+        research_response = requests.post(
+            f"{SUPABASE_URL}/functions/v1/enrichment-venues-batch",
+            headers=headers,
+            json={
+                "venues": [research_payload(discovery) for discovery in chunk],
+                "delayBetweenRequests": delay * 1000
+            },
+            timeout=(60 + delay) * len(chunk)
+        )
+
+        if research_response.status_code != 200:
+            raise Exception(f"HTTP {research_response.status_code}: {research_response.text}")
+
+        details = research_response.json().get('details', [])
+
+    except Exception as e:
+        return [(UNKNOWN, None, f"Batch error: {str(e)}")] * len(chunk)
+
+    outcomes = []
+    for i, discovery in enumerate(chunk):
+        detail = details[i] if i < len(details) else None
+        if not detail or detail.get('venue') != discovery.get('name', 'Unknown'):
+            outcomes.append((UNKNOWN, None, "Missing from batch response"))
+        elif detail.get('status') == 'success':
+            outcomes.append((RESEARCHED, {"id": detail.get('id'), "images_count": detail.get('images')}, None))
+        elif detail.get('status') == 'skipped':
+            outcomes.append((SKIPPED, None, None))
+        else:
+            outcomes.append((FAILED, None, detail.get('error') or 'Unknown error'))
+    return outcomes
+
+
+def mark_researched(discovery, listing_id):
+    """Mark a discovery researched (listing_id is None when its listing already existed), returning the fields updated"""
+    update = {
+        "status": "researched",
+        "listing_id": listing_id,
+        "researched_at": datetime.utcnow().isoformat()
+    }
+    requests.patch(
+        f"{SUPABASE_URL}/rest/v1/discovered_listings?id=eq.{discovery['id']}",
+        headers={**headers, "Prefer": "return=minimal"},
+        json=update
+    )
+    return update
+
+
+def mark_failed(discovery):
+    """Mark a discovery research_failed, returning the fields updated"""
+    update = {"status": "research_failed"}
+    try:
+        requests.patch(
+            f"{SUPABASE_URL}/rest/v1/discovered_listings?id=eq.{discovery['id']}",
+            headers={**headers, "Prefer": "return=minimal"},
+            json=update
+        )
+    except:
+        pass
+    return update
+
+
+def print_discovery(progress, discovery):
+    print(f"{progress} 🔍 Researching: {discovery.get('name', 'Unknown')}")
+    print(f"   📍 {discovery.get('location', 'Unknown')}, {discovery.get('city', 'Unknown')}")
+    print(f"   📊 Engagement: {discovery.get('engagement_score', 0)}/10")
+    print(f"   🏷️  Type: {discovery.get('service_type') or 'venue'}")
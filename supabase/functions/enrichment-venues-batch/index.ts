@@ -15,6 +15,7 @@ interface VenueBatchRequest {
     location: string
     city: string
     state: string
+    serviceType?: string
   }>
   delayBetweenRequests?: number // milliseconds
 }
@@ -59,6 +60,7 @@ serve(async (req) => {
             location: venue.location,
             city: venue.city,
             state: venue.state,
+            serviceType: venue.serviceType,
             forceRefresh: false
           })
         })
@@ -0,0 +1,334 @@
+"""
+Pool of authenticated Instagram accounts with health-aware rotation
+
+Each request goes to the healthiest available account: accounts cooling down
+after a rate limit are skipped, then the lowest health tier (error rate to
+one decimal) wins, then the least recently used (so healthy accounts share
+load round-robin). A rate-limited request fails over to the next account, so
+throughput scales with the number of accounts.
+
+The error rate decays with time as well as with successes, so an account
+benched by an old error drifts back into rotation. Only Instagram and
+transport failures count against an account; a missing user or location is
+the request's fault. When Supabase is configured, cooldowns and error rates
+are kept in instagram_account_health, so a cold start doesn't hand a request
+to an account that was rate limited a minute ago.
+
+Accounts come from INSTAGRAM_ACCOUNTS, a JSON list of
+{"username", "password", "settings"?, "session_file"?}, or from the single
+INSTAGRAM_USERNAME / INSTAGRAM_PASSWORD / INSTAGRAM_SETTINGS variables.
+"""
+
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Callable, Optional
+
+from profiling import phase
+from supabase_rest import SupabaseRest
+
+COOLDOWN_SECONDS = 10 * 60   # First cooldown after a rate limit, doubled on repeats
+MAX_COOLDOWN_SECONDS = 2 * 60 * 60
+ERROR_DECAY = 0.2            # Weight of the newest outcome in the error rate
+ERROR_HALF_LIFE_SECONDS = 10 * 60
+DEFAULT_SESSION_FILE = '/tmp/instagram_session.json'
+
+# instagrapi errors that are about the request (unknown or private target), not the account
+INPUT_ERRORS = ('NotFoundError', 'ClientNotFoundError', 'PrivateAccount')
+
+def is_rate_limited(error: Exception) -> bool:
+    exceptions = sys.modules.get('instagrapi.exceptions')
+    return exceptions is not None and isinstance(error, exceptions.PleaseWaitFewMinutes)
+
+def is_login_required(error: Exception) -> bool:
+    exceptions = sys.modules.get('instagrapi.exceptions')
+    return exceptions is not None and isinstance(error, exceptions.LoginRequired)
+
+def counts_against_account(error: Optional[BaseException]) -> bool:
+    """Whether a failure reflects on the account: an Instagram or transport error"""
+    if error is None:
+        return False
+    if isinstance(error, OSError):  # Connection errors and timeouts, including requests' exceptions
+        return True
+    exceptions = sys.modules.get('instagrapi.exceptions')
+    if exceptions is None or not type(error).__module__.startswith('instagrapi'):
+        return False
+    input_errors = tuple(getattr(exceptions, name) for name in INPUT_ERRORS if hasattr(exceptions, name))
+    return not isinstance(error, input_errors)
+
+class AllAccountsCoolingDown(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f'All Instagram accounts are rate limited. Retry in {int(retry_after)}s.')
+        self.retry_after = retry_after
+
+def default_client_factory():
+    """Create an instagrapi client (imported here to keep cold starts cheap)"""
+    from instagrapi import Client
+
+    client = Client()
+    client.delay_range = [1, 3]  # Random delay between requests
+    return client
+
+class Account:
+    def __init__(self, username: str, password: str, settings: Dict[str, Any] = None, session_file: str = None):
+        self.username = username
+        self.password = password
+        self.settings = settings
+        self.session_file = session_file or f'/tmp/instagram_session_{username}.json'
+
+        self.client = None
+        self.logged_in = False
+        self.cooldown_until = 0.0
+        self.last_rate_limited = 0.0
+        self.rate_limit_streak = 0
+        self.error_rate = 0.0
+        self.error_at = 0.0  # When error_rate was last updated; it halves every ERROR_HALF_LIFE_SECONDS
+        self.last_used = 0.0
+        self.requests = 0
+
+    def current_error_rate(self, now: float) -> float:
+        if not self.error_rate:
+            return 0.0
+        return self.error_rate * 0.5 ** (max(0.0, now - self.error_at) / ERROR_HALF_LIFE_SECONDS)
+
+    def health(self, now: float) -> Dict[str, Any]:
+        return {
+            'username': self.username,
+            'available': self.cooldown_until <= now,
+            'cooldown_seconds': max(0, round(self.cooldown_until - now)),
+            'error_rate': round(self.current_error_rate(now), 3),
+            'requests': self.requests
+        }
+
+def _timestamp(seconds: float) -> Optional[str]:
+    return datetime.fromtimestamp(seconds, timezone.utc).isoformat() if seconds else None
+
+def _seconds(timestamp: Optional[str]) -> float:
+    return datetime.fromisoformat(timestamp).timestamp() if timestamp else 0.0
+
+class HealthStore:
+    """Account cooldowns and error rates in the instagram_account_health table"""
+
+    def __init__(self, rest: SupabaseRest):
+        self.rest = rest
+
+    def load(self, accounts: List[Account]):
+        by_username = {account.username: account for account in accounts}
+        quoted = ','.join(json.dumps(username) for username in by_username)
+        for row in self.rest.request('instagram_account_health', {'select': '*', 'username': f'in.({quoted})'}):
+            account = by_username[row['username']]
+            account.cooldown_until = _seconds(row['cooldown_until'])
+            account.last_rate_limited = _seconds(row['last_rate_limited'])
+            account.rate_limit_streak = row['rate_limit_streak']
+            account.error_rate = row['error_rate']
+            account.error_at = _seconds(row['error_at'])
+
+    def save(self, account: Account):
+        self.rest.request('instagram_account_health', {'on_conflict': 'username'}, payload=[{
+            'username': account.username,
+            'cooldown_until': _timestamp(account.cooldown_until),
+            'last_rate_limited': _timestamp(account.last_rate_limited),
+            'rate_limit_streak': account.rate_limit_streak,
+            'error_rate': account.error_rate,
+            'error_at': _timestamp(account.error_at),
+            'updated_at': _timestamp(time.time())
+        }], prefer='resolution=merge-duplicates,return=minimal')
+
+class AccountPool:
+    """
+    Args:
+        accounts: Accounts to rotate between
+        client_factory: Builds a fresh client per account (a fake in tests)
+        clock: Time source (injectable for tests)
+        store: Where account health is persisted across cold starts; None keeps it in memory
+    """
+
+    def __init__(self, accounts: List[Account], client_factory: Callable = default_client_factory,
+                 clock: Callable[[], float] = time.time, store: HealthStore = None):
+        if not accounts:
+            raise ValueError('Instagram credentials not configured')
+        self.accounts = accounts
+        self.client_factory = client_factory
+        self.clock = clock
+        self.store = store
+
+        if store is not None:
+            try:
+                store.load(accounts)
+            except Exception as e:
+                print(f'Could not load account health: {e}')
+
+    @classmethod
+    def from_env(cls, **kwargs) -> 'AccountPool':
+        configured = os.getenv('INSTAGRAM_ACCOUNTS')
+        if configured:
+            accounts = [Account(a['username'], a['password'], a.get('settings'), a.get('session_file'))
+                        for a in json.loads(configured)]
+        else:
+            username = os.getenv('INSTAGRAM_USERNAME')
+            password = os.getenv('INSTAGRAM_PASSWORD')
+            settings = os.getenv('INSTAGRAM_SETTINGS')
+            accounts = []
+            if username and password:
+                accounts.append(Account(
+                    username, password,
+                    json.loads(settings) if settings else None,
+                    os.getenv('INSTAGRAM_SESSION_FILE', DEFAULT_SESSION_FILE)
+                ))
+        if 'store' not in kwargs and SupabaseRest.configured():
+            kwargs['store'] = HealthStore(SupabaseRest.from_env())
+        return cls(accounts, **kwargs)
+
+    def acquire(self) -> Account:
+        """The healthiest account that is not cooling down"""
+        now = self.clock()
+        available = [a for a in self.accounts if a.cooldown_until <= now]
+        if not available:
+            raise AllAccountsCoolingDown(min(a.cooldown_until for a in self.accounts) - now)
+        return min(available, key=lambda a: (round(a.current_error_rate(now), 1), a.last_used))
+
+    @phase('login')
+    def login(self, account: Account, force: bool = False):
+        """
+        Return the account's logged-in client, restoring a saved session when
+        possible. A session with a sessionid is restored without contacting
+        Instagram; force=True does a fresh password login.
+        """
+        if account.logged_in and not force:
+            return account.client
+
+        if account.client is None:
+            account.client = self.client_factory()
+        client = account.client
+
+        if not force:
+            try:
+                settings = account.settings
+                if settings is None and os.path.exists(account.session_file):
+                    with open(account.session_file) as f:
+                        settings = json.load(f)
+                if settings and settings.get('authorization_data', {}).get('sessionid'):
+                    client.set_settings(settings)
+                    client.username = account.username
+                    client.password = account.password
+                    account.logged_in = True
+                    print(f'Restored Instagram session for {account.username}')
+                    return client
+            except Exception as e:
+                print(f'Session restore error for {account.username}: {e}')
+
+        # Fresh login, keeping the device identity of any previous session
+        uuids = client.get_settings().get('uuids')
+        client.set_settings({})
+        if uuids:
+            client.set_uuids(uuids)
+        client.login(account.username, account.password)
+        client.dump_settings(account.session_file)
+        account.settings = None  # The session file is now the freshest copy
+        account.logged_in = True
+        print(f'Created new Instagram session for {account.username}')
+        return client
+
+    def _save(self, account: Account):
+        if self.store is None:
+            return
+        try:
+            self.store.save(account)
+        except Exception as e:
+            print(f'Could not save account health for {account.username}: {e}')
+
+    def _record_outcome(self, account: Account, failed: bool):
+        now = self.clock()
+        account.error_rate = account.current_error_rate(now) * (1 - ERROR_DECAY) + (ERROR_DECAY if failed else 0)
+        account.error_at = now
+
+    def report_success(self, account: Account):
+        clean = account.current_error_rate(self.clock()) < 0.01 and account.rate_limit_streak == 0
+        self._record_outcome(account, failed=False)
+        account.rate_limit_streak = 0
+        if not clean:  # Nothing worth a write while the account stays healthy
+            self._save(account)
+
+    def report_error(self, account: Account):
+        self._record_outcome(account, failed=True)
+        self._save(account)
+
+    def report_rate_limited(self, account: Account):
+        now = self.clock()
+        self._record_outcome(account, failed=True)
+        account.rate_limit_streak += 1
+        account.last_rate_limited = now
+        account.cooldown_until = now + min(COOLDOWN_SECONDS * 2 ** (account.rate_limit_streak - 1),
+                                           MAX_COOLDOWN_SECONDS)
+        print(f'{account.username} rate limited, cooling down until {time.ctime(account.cooldown_until)}')
+        self._save(account)
+
+    def report_failure(self, account: Account, error: Exception):
+        """Record a failed request, ignoring errors that are the request's fault"""
+        # A partial fetch keeps the page error as its cause
+        errors = (error, error.__cause__)
+        if any(is_rate_limited(e) for e in errors):
+            self.report_rate_limited(account)
+        elif any(counts_against_account(e) for e in errors):
+            self.report_error(account)
+
+    @contextmanager
+    def session(self):
+        """
+        Check out the healthiest account's client for one request, recording
+        the outcome. Used for streams, which cannot be retried once started.
+        """
+        account = self.acquire()
+        account.last_used = self.clock()
+        account.requests += 1
+        try:
+            yield self.login(account)
+        except Exception as e:
+            self.report_failure(account, e)
+            raise
+        else:
+            self.report_success(account)
+
+    def run(self, fetch: Callable[[Any], Any], partial_error: Callable[[Any], Exception] = None):
+        """
+        Call fetch(client) on the healthiest account, logging in again once on
+        an expired session and failing over to the next account on rate limits
+
+        partial_error(result), when given, returns the error that cut a
+        result short (or None). The result is still returned, but the error
+        counts against the account, so a rate limit on a later page starts
+        a cooldown.
+        """
+        while True:
+            account = self.acquire()
+            account.last_used = self.clock()
+            account.requests += 1
+            try:
+                client = self.login(account)
+                try:
+                    result = fetch(client)
+                except Exception as e:
+                    if not is_login_required(e):
+                        raise
+                    print(f'Instagram session for {account.username} expired, logging in again')
+                    result = fetch(self.login(account, force=True))
+            except Exception as e:
+                if is_rate_limited(e):
+                    self.report_rate_limited(account)
+                    continue  # acquire() raises once every account is cooling down
+                self.report_failure(account, e)
+                raise
+
+            error = partial_error(result) if partial_error else None
+            if error is not None:
+                self.report_failure(account, error)
+            else:
+                self.report_success(account)
+            return result
+
+    def health(self) -> List[Dict[str, Any]]:
+        now = self.clock()
+        return [account.health(now) for account in self.accounts]
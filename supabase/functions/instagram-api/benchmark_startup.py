@@ -0,0 +1,157 @@
+"""
+Cold-start benchmark for the instagram-api function
+
+Measures, in fresh interpreters:
+  - the `python -X importtime` breakdown of `import main` (the modules it imports)
+  - time to import main and to import instagrapi itself
+  - time to the first handler() response for a given event
+
+Usage:
+    python benchmark_startup.py [--runs N] [--event '{"action": "..."}']
+
+By default the first response is a monitor_user request served by a real
+instagrapi client with a restored session whose network calls are stubbed
+to return 12 posts. That times everything a cold start pays for (imports,
+client setup, session restore, transform and serialize) without contacting
+Instagram. --event sends that event to Instagram instead, using the
+accounts configured in the environment (see account_pool.py). A response
+without "success": true fails the benchmark, since it would only time the
+path to the error.
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULT_EVENT = {'body': json.dumps({'action': 'monitor_user', 'username': 'benchmark', 'limit': 12})}
+
+TIME_TO_RESPONSE = '''
+import json, os, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+if sys.argv[2] == 'stub':
+    # One restored session whose client answers monitor_user locally
+    from datetime import datetime, timezone
+    from types import SimpleNamespace
+    import account_pool
+
+    def stub_client_factory():
+        client = account_pool.default_client_factory()
+        posted_at = datetime.now(timezone.utc)
+        medias = [SimpleNamespace(pk=str(i), media_type=1, thumbnail_url=f'https://scontent.cdninstagram.com/{i}.jpg',
+                                  resources=[], caption_text='#wedding', taken_at=posted_at, like_count=100,
+                                  comment_count=5)
+                  for i in range(50)]
+        client.user_id_from_username = lambda username: '1'
+        client.user_medias_paginated_v1 = lambda user_id, amount, end_cursor='': (medias[:amount], '')
+        return client
+
+    main.pool = account_pool.AccountPool(
+        [account_pool.Account('benchmark', '', {'authorization_data': {'sessionid': 'benchmark'}}, os.devnull)],
+        client_factory=stub_client_factory
+    )
+response = main.handler(json.loads(sys.argv[1]), None)
+body = response['body']
+if not isinstance(body, str):
+    body = ''.join(body)
+done = time.perf_counter()
+try:
+    result = json.loads(body.splitlines()[-1])  # The whole response, or a stream's summary line
+except (ValueError, IndexError):
+    result = None  # A base64 msgpack or gzip body
+print(json.dumps({'import_ms': (imported - start) * 1000, 'first_response_ms': (done - start) * 1000,
+                  'status': response['statusCode'],
+                  'success': result.get('success') if isinstance(result, dict) else None,
+                  'error': result.get('error') if isinstance(result, dict) else None}))
+'''
+
+def run_python(args, env=None):
+    return subprocess.run([sys.executable] + args, cwd=HERE, capture_output=True, text=True,
+                          env={**os.environ, **(env or {})})
+
+def importtime_breakdown(module: str, top: int = 15):
+    """
+    Cumulative import time of module and of each module it imports directly,
+    as (total, [(name, microseconds), ...] slowest first)
+    """
+    result = run_python(['-X', 'importtime', '-c', f'import {module}'])
+    rows = []  # (depth, name, cumulative) in the order imports finished
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, raw_name = line.split(':', 1)[1].split('|')
+        if not cumulative.strip().isdigit():
+            continue  # header row
+        # Each level of nesting indents the name by two more spaces
+        depth = (len(raw_name) - len(raw_name.lstrip()) - 1) // 2
+        rows.append((depth, raw_name.strip(), int(cumulative.strip())))
+
+    # A module's imports finish, one level deeper, just before it does
+    position = max(i for i, (depth, name, _) in enumerate(rows) if depth == 0 and name == module)
+    children = []
+    for depth, name, cumulative in reversed(rows[:position]):
+        if depth == 0:
+            break
+        if depth == 1:
+            children.append((name, cumulative))
+    return rows[position][2], sorted(children, key=lambda item: item[1], reverse=True)[:top]
+
+def wall_time(code: str, runs: int):
+    """Median wall time in ms of a fresh interpreter running code"""
+    samples = []
+    for _ in range(runs):
+        result = run_python(['-c', f'import time; s = time.perf_counter(); {code}; print((time.perf_counter() - s) * 1000)'])
+        if result.returncode != 0:
+            return None
+        samples.append(float(result.stdout.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+def main():
+    runs = 5
+    event = DEFAULT_EVENT
+    stub = True
+    for i, arg in enumerate(sys.argv):
+        if arg == '--runs' and i + 1 < len(sys.argv):
+            runs = int(sys.argv[i + 1])
+        elif arg == '--event' and i + 1 < len(sys.argv):
+            event = {'body': sys.argv[i + 1]}
+            stub = False
+
+    total, children = importtime_breakdown('main')
+    print(f'⏱️  import main: {total / 1000:.1f} ms, by module it imports (python -X importtime, cumulative)')
+    for name, micros in children:
+        print(f'   {name:<30}{micros / 1000:>10.1f} ms')
+    print()
+
+    instagrapi_ms = wall_time('import instagrapi', runs)
+    print(f'📦 import instagrapi (deferred until first Instagram call): '
+          f'{"not installed" if instagrapi_ms is None else f"{instagrapi_ms:.1f} ms"}')
+
+    samples = []
+    for _ in range(runs):
+        result = run_python(['-c', TIME_TO_RESPONSE, json.dumps(event), 'stub' if stub else 'live'])
+        if result.returncode != 0:
+            print(result.stderr)
+            sys.exit(1)
+        samples.append(json.loads(result.stdout.strip().splitlines()[-1]))
+
+    failed = next((s for s in samples if s['status'] != 200 or s['success'] is False), None)
+    if failed:
+        print(f'❌ The request failed (status {failed["status"]}: {failed["error"]}), '
+              f'so there is no time to first response to report')
+        sys.exit(1)
+
+    print(f'🚀 import main: {statistics.median(s["import_ms"] for s in samples):.1f} ms (median of {runs})')
+    source = 'stubbed Instagram' if stub else 'live Instagram'
+    print(f'🚀 time to first response: {statistics.median(s["first_response_ms"] for s in samples):.1f} ms '
+          f'(status {samples[0]["status"]}, {source})')
+    if samples[0]['success'] is None:
+        print('⚠️  Binary response body, so "success" was not checked')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,272 @@
+"""
+Gazetteer of resolved Instagram locations with a nearest-city index
+
+discover_location used to call location_search and take the first result on
+every call. Resolved names are now kept (name -> pk, lat, lng) in the
+instagram_gazetteer table in Supabase (see the create_instagram_gazetteer
+migration), so each place is searched once across every instance and cold
+start. The deployed bundle is read-only, so nothing is stored next to the code.
+
+`preload` resolves the cities tracked in config/discovery-locations.yaml and
+stores each under "City, STATE, Country" and the "City, Country" alias that
+instagram_trend_config's location_query values use, then resolves any other
+location_query in that table. The tracked cities are indexed in a KD-tree,
+so any coordinate can be assigned to its nearest city in O(log n).
+
+Usage:
+    python gazetteer.py preload [config/discovery-locations.yaml]
+    python gazetteer.py nearest LAT LNG
+"""
+
+import math
+import os
+import sys
+from types import SimpleNamespace
+from typing import List, Dict, Any, Optional, Tuple
+
+from supabase_rest import SupabaseRest
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              '..', '..', '..', 'config', 'discovery-locations.yaml')
+
+EARTH_RADIUS_KM = 6371.0
+MAX_CITY_DISTANCE_KM = 100.0  # Posts further than this from every tracked city get no city
+PLACE_FIELDS = ('name', 'pk', 'address', 'lat', 'lng')
+
+def normalize(name: str) -> str:
+    return ' '.join(name.lower().replace(',', ' ').split())
+
+def to_xyz(lat: float, lng: float) -> Tuple[float, float, float]:
+    """Unit vector for a coordinate, so straight-line nearest == great-circle nearest"""
+    lat, lng = math.radians(lat), math.radians(lng)
+    return (math.cos(lat) * math.cos(lng), math.cos(lat) * math.sin(lng), math.sin(lat))
+
+def chord_to_km(chord: float) -> float:
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, chord / 2))
+
+class KDTree:
+    """Static 3-d tree over (point, item) pairs with nearest-neighbour search"""
+
+    def __init__(self, points: List[Tuple[Tuple[float, float, float], Any]]):
+        self.root = self._build(points, 0)
+
+    def _build(self, points, depth):
+        if not points:
+            return None
+        axis = depth % 3
+        points = sorted(points, key=lambda p: p[0][axis])
+        mid = len(points) // 2
+        return (points[mid], axis, self._build(points[:mid], depth + 1), self._build(points[mid + 1:], depth + 1))
+
+    def nearest(self, target: Tuple[float, float, float]):
+        """(item, straight-line distance) of the closest point, or (None, inf)"""
+        best = [None, math.inf]
+
+        def search(node):
+            if node is None:
+                return
+            (point, item), axis, left, right = node
+            distance = math.dist(point, target)
+            if distance < best[1]:
+                best[0], best[1] = item, distance
+
+            diff = target[axis] - point[axis]
+            near, far = (left, right) if diff < 0 else (right, left)
+            search(near)
+            if abs(diff) < best[1]:
+                search(far)
+
+        search(self.root)
+        return best[0], best[1]
+
+class Gazetteer:
+    """
+    Args:
+        rest: Supabase client for the instagram_gazetteer table; None keeps
+            resolved places in memory only
+    """
+
+    def __init__(self, rest: Optional[SupabaseRest] = None):
+        self.rest = rest
+        self.places: Dict[str, Dict[str, Any]] = {}
+        self.cities: Dict[str, Dict[str, Any]] = {}
+        self._index = None
+        self._warned_empty = False
+
+        if rest is not None:
+            try:
+                self.load()
+            except Exception as e:
+                # Still usable: misses fall back to location_search
+                print(f'Could not load gazetteer: {e}')
+
+    @classmethod
+    def from_env(cls) -> 'Gazetteer':
+        if not SupabaseRest.configured():
+            print('Gazetteer is in memory only: SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY are not set')
+            return cls()
+        return cls(SupabaseRest.from_env())
+
+    def load(self):
+        for row in self.rest.request('instagram_gazetteer', {'select': '*'}):
+            place = {field: row[field] for field in PLACE_FIELDS}
+            self.places[row['query']] = place
+            if row.get('city'):
+                self.cities[f'{row["city"]}, {row["state"]}'] = {'city': row['city'], 'state': row['state'], **place}
+        self._index = None
+
+    def _store(self, query: str, place: Dict[str, Any], city: str = None, state: str = None):
+        """Upsert one row; a failed write only costs a repeat search on other instances"""
+        if self.rest is None:
+            return
+        try:
+            self.rest.request(
+                'instagram_gazetteer',
+                {'on_conflict': 'query'},
+                payload=[{'query': query, 'city': city, 'state': state,
+                          **{field: place.get(field) for field in PLACE_FIELDS}}],
+                prefer='resolution=merge-duplicates,return=minimal'
+            )
+        except Exception as e:
+            print(f'Could not save gazetteer entry {query!r}: {e}')
+
+    def resolve(self, client, name: str):
+        """
+        Location for a free-text name, searching Instagram only on a cache miss
+
+        Returns an object with name, pk, address, lat and lng, or None
+        """
+        key = normalize(name)
+        place = self.places.get(key)
+
+        if place is None:
+            locations = client.location_search(name)
+            if not locations:
+                return None
+
+            # Use the first (most relevant) location
+            location = locations[0]
+            place = {
+                'name': location.name,
+                'pk': location.pk,
+                'address': getattr(location, 'address', None),
+                'lat': getattr(location, 'lat', None),
+                'lng': getattr(location, 'lng', None)
+            }
+            self.places[key] = place
+            self._store(key, place)
+
+        return SimpleNamespace(**place)
+
+    def add_alias(self, alias: str, place: Dict[str, Any]) -> bool:
+        """Store place under another name unless that name is already resolved"""
+        key = normalize(alias)
+        if key in self.places:
+            return False
+        self.places[key] = place
+        self._store(key, place)
+        return True
+
+    def add_city(self, city: str, state: str, query: str, place: Dict[str, Any]):
+        """Mark the place resolved for query as a tracked city"""
+        self.cities[f'{city}, {state}'] = {'city': city, 'state': state, **place}
+        self._store(normalize(query), place, city, state)
+        self._index = None
+
+    def nearest_city(self, lat: Optional[float], lng: Optional[float],
+                     max_km: float = MAX_CITY_DISTANCE_KM) -> Tuple[Optional[Dict[str, Any]], Optional[float]]:
+        """(configured city entry, distance in km) closest to a coordinate; entry is None past max_km"""
+        if lat is None or lng is None:
+            return None, None
+
+        if not self.cities:
+            if not self._warned_empty:
+                print('Gazetteer has no tracked cities, so posts get no city; run `python gazetteer.py preload`')
+                self._warned_empty = True
+            return None, None
+
+        if self._index is None:
+            self._index = KDTree([
+                (to_xyz(entry['lat'], entry['lng']), entry)
+                for entry in self.cities.values()
+                if entry.get('lat') is not None and entry.get('lng') is not None
+            ])
+
+        entry, chord = self._index.nearest(to_xyz(lat, lng))
+        if entry is None:
+            return None, None
+
+        distance = chord_to_km(chord)
+        if distance > max_km:
+            return None, distance
+        return entry, distance
+
+    def trend_location_queries(self) -> List[str]:
+        """Distinct location_query values instagram-trend-processor sends to discover_location"""
+        rows = self.rest.request('instagram_trend_config', {
+            'select': 'location_query',
+            'discovery_type': 'eq.location',
+            'location_query': 'not.is.null'
+        })
+        return list(dict.fromkeys(row['location_query'] for row in rows))
+
+    def preload(self, client, config_path: str = DEFAULT_CONFIG, country: str = 'Australia',
+                queries: List[str] = ()) -> int:
+        """
+        Resolve and index every city in the discovery config, then resolve
+        queries (location_query values), returning how many cities were added
+        """
+        import yaml  # Only needed when preloading, not in the deployed function
+
+        with open(config_path) as f:
+            config = yaml.safe_load(f)
+
+        added = 0
+        for group in config.get('locations', []):
+            for city in group.get('cities', []):
+                if f'{city}, {group["state"]}' in self.cities:
+                    continue
+                query = f'{city}, {group["state"]}, {country}'
+                place = self.resolve(client, query)
+                if place is None:
+                    print(f'No location found for {city}, {group["state"]}')
+                    continue
+                self.add_city(city, group['state'], query, vars(place))
+                self.add_alias(f'{city}, {country}', vars(place))
+                added += 1
+                print(f'Resolved {city}, {group["state"]}: {place.name} ({place.lat}, {place.lng})')
+
+        for query in queries:
+            if normalize(query) in self.places:
+                continue
+            place = self.resolve(client, query)
+            if place is None:
+                print(f'No location found for {query}')
+            else:
+                print(f'Resolved {query}: {place.name} ({place.lat}, {place.lng})')
+
+        return added
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    gazetteer = Gazetteer(SupabaseRest.from_env())
+
+    if command == 'preload':
+        from account_pool import AccountPool
+
+        pool = AccountPool.from_env()
+        config_path = sys.argv[2] if len(sys.argv) > 2 else DEFAULT_CONFIG
+        queries = gazetteer.trend_location_queries()
+        added = pool.run(lambda client: gazetteer.preload(client, config_path, queries=queries))
+        print(f'Added {added} cities ({len(gazetteer.cities)} indexed, {len(gazetteer.places)} places cached)')
+
+    elif command == 'nearest' and len(sys.argv) == 4:
+        entry, distance = gazetteer.nearest_city(float(sys.argv[2]), float(sys.argv[3]))
+        if entry:
+            print(f'{entry["city"]}, {entry["state"]} ({distance:.1f} km)')
+        else:
+            print('No tracked city nearby')
+
+    else:
+        print(__doc__)
+        sys.exit(1)
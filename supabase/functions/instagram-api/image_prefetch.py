@@ -0,0 +1,282 @@
+"""
+Concurrent image prefetch with content-addressed caching and perceptual dedupe
+
+Vendors repost the same photo across hashtags, locations and carousels. This
+stage downloads post image URLs with a bounded thread pool, stores each image
+once under its SHA-256 and drops near-duplicates (same picture re-encoded or
+resized) by comparing 64-bit difference hashes before anything is uploaded.
+
+Each image's difference hash is computed on the worker that fetched it and
+kept in the cache index next to the URL, so cached images are classified
+without being read back from disk. The index also records which images were
+kept (returned as unique) in earlier runs, and later batches are deduped
+against them, so a repost of an already uploaded photo is never uploaded again. At most a few images per worker are in
+flight at once, so memory stays flat however many URLs a batch has.
+
+Usage:
+    python image_prefetch.py response.json [--cache-dir DIR] [--workers N]
+"""
+
+import hashlib
+import io
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Iterable
+
+import requests
+from PIL import Image
+
+DEFAULT_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', '/tmp/instagram_images')
+DEFAULT_WORKERS = 8
+DEFAULT_MAX_DISTANCE = 6  # Max differing bits (of 64) for two images to count as the same photo
+IN_FLIGHT_PER_WORKER = 2  # Queued fetches per worker, enough to keep every worker busy
+
+_local = threading.local()
+
+def _session() -> requests.Session:
+    """One pooled HTTP session per worker thread"""
+    if not hasattr(_local, 'session'):
+        _local.session = requests.Session()
+    return _local.session
+
+def dhash(data: bytes, size: int = 8) -> int:
+    """64-bit difference hash: compares neighbouring pixels of a tiny grayscale thumbnail"""
+    with Image.open(io.BytesIO(data)) as image:
+        pixels = list(image.convert('L').resize((size + 1, size), Image.LANCZOS).getdata())
+
+    value = 0
+    for row in range(size):
+        for col in range(size):
+            left = pixels[row * (size + 1) + col]
+            right = pixels[row * (size + 1) + col + 1]
+            value = (value << 1) | (left > right)
+    return value
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+class ImagePrefetcher:
+    """
+    Download, cache and dedupe images
+
+    Args:
+        cache_dir: Directory for the content-addressed cache
+        workers: Maximum concurrent downloads
+        max_distance: dHash distance at or below which images are near-duplicates
+        timeout: Per-request timeout in seconds
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, workers: int = DEFAULT_WORKERS,
+                 max_distance: int = DEFAULT_MAX_DISTANCE, timeout: int = 15):
+        self.cache_dir = cache_dir
+        self.workers = workers
+        self.max_distance = max_distance
+        self.timeout = timeout
+        self.index_file = os.path.join(cache_dir, 'urls.json')
+        self.url_index = {}  # url -> sha256, so cached URLs are never downloaded twice
+        self.phashes = {}    # sha256 -> dhash of every cached image, so cache hits are never re-read
+        self.hashes = {}     # sha256 -> dhash of every image kept so far, in this or earlier runs
+
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(self.index_file):
+            with open(self.index_file) as f:
+                index = json.load(f)
+            if 'urls' in index:
+                self.url_index = index['urls']
+                self.phashes = {digest: int(phash, 16) for digest, phash in index['phashes'].items()}
+                self.hashes = {digest: self.phashes[digest] for digest in index.get('kept', [])
+                               if digest in self.phashes}
+            else:
+                self.url_index = index  # Older index of URLs only; dhashes are filled in as images are seen
+
+    def _path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, digest[:2], digest)
+
+    def _fetch(self, url: str) -> Dict[str, Any]:
+        """
+        Download one URL into the cache and hash it (runs on a worker thread)
+
+        Returns sizes and hashes only, never the image bytes, so finished
+        fetches waiting to be classified hold almost no memory.
+        """
+        digest = self.url_index.get(url)
+        if digest and os.path.exists(self._path(digest)):
+            path = self._path(digest)
+            fetched = {'url': url, 'sha256': digest, 'size': os.path.getsize(path), 'downloaded': 0}
+            if digest in self.phashes:
+                fetched['phash'] = self.phashes[digest]
+            else:
+                with open(path, 'rb') as f:
+                    self._hash(fetched, f.read())
+            return fetched
+
+        response = _session().get(url, timeout=self.timeout)
+        response.raise_for_status()
+        data = response.content
+        digest = hashlib.sha256(data).hexdigest()
+
+        path = self._path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f'{path}.{threading.get_ident()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+
+        fetched = {'url': url, 'sha256': digest, 'size': len(data), 'downloaded': len(data)}
+        if digest in self.phashes:
+            fetched['phash'] = self.phashes[digest]
+        else:
+            self._hash(fetched, data)
+        return fetched
+
+    @staticmethod
+    def _hash(fetched: Dict[str, Any], data: bytes):
+        try:
+            fetched['phash'] = dhash(data)
+        except Exception as e:
+            fetched['error'] = f'Not an image: {e}'
+
+    def _save_index(self):
+        # Written aside and swapped in, so an interrupted run can't leave a corrupt index behind
+        tmp_path = f'{self.index_file}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'urls': self.url_index,
+                'phashes': {digest: f'{phash:016x}' for digest, phash in self.phashes.items()},
+                'kept': list(self.hashes)
+            }, f)
+        os.replace(tmp_path, self.index_file)
+
+    def _find_duplicate(self, phash: int):
+        for digest, other in self.hashes.items():
+            if hamming(phash, other) <= self.max_distance:
+                return digest
+        return None
+
+    def prefetch(self, urls: Iterable[str]) -> Dict[str, Any]:
+        """
+        Fetch URLs concurrently and classify each as unique, duplicate or failed
+
+        Returns:
+            Dict with one entry per URL under "images" plus throughput and
+            bytes-saved totals. Images with "duplicate_of" set need no upload.
+        """
+        urls = list(dict.fromkeys(urls))
+        start = time.time()
+        images = []
+        failed = 0
+        bytes_downloaded = 0
+        bytes_saved = 0
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            pending = iter(urls)
+            in_flight = deque()
+            for url in pending:
+                in_flight.append((url, pool.submit(self._fetch, url)))
+                if len(in_flight) >= self.workers * IN_FLIGHT_PER_WORKER:
+                    break
+
+            # Dedupe on this thread in submission order so results are deterministic,
+            # topping the window back up as each fetch is handled
+            while in_flight:
+                url, future = in_flight.popleft()
+                next_url = next(pending, None)
+                if next_url is not None:
+                    in_flight.append((next_url, pool.submit(self._fetch, next_url)))
+
+                try:
+                    fetched = future.result()
+                except Exception as e:
+                    failed += 1
+                    images.append({'url': url, 'error': str(e)})
+                    continue
+
+                bytes_downloaded += fetched['downloaded']
+                self.url_index[url] = fetched['sha256']
+                if 'error' in fetched:
+                    failed += 1
+                    images.append({'url': url, 'error': fetched['error']})
+                    continue
+
+                phash = fetched['phash']
+                self.phashes[fetched['sha256']] = phash
+                entry = {'url': url, 'sha256': fetched['sha256'], 'path': self._path(fetched['sha256'])}
+
+                if fetched['sha256'] in self.hashes:
+                    entry['duplicate_of'] = fetched['sha256']
+                else:
+                    entry['phash'] = f'{phash:016x}'
+                    duplicate = self._find_duplicate(phash)
+                    if duplicate:
+                        entry['duplicate_of'] = duplicate
+                    else:
+                        self.hashes[fetched['sha256']] = phash
+
+                if 'duplicate_of' in entry:
+                    bytes_saved += fetched['size']
+                images.append(entry)
+
+        self._save_index()
+
+        elapsed = time.time() - start
+        unique = sum(1 for image in images if 'sha256' in image and 'duplicate_of' not in image)
+
+        return {
+            'images': images,
+            'total': len(urls),
+            'unique': unique,
+            'duplicates': len(images) - unique - failed,
+            'failed': failed,
+            'bytes_downloaded': bytes_downloaded,
+            'bytes_saved': bytes_saved,
+            'elapsed_seconds': round(elapsed, 3),
+            'images_per_second': round(len(urls) / elapsed, 2) if elapsed > 0 else 0
+        }
+
+def prefetch_posts(posts: List[Dict[str, Any]], prefetcher: ImagePrefetcher = None) -> Dict[str, Any]:
+    """
+    Prefetch every image of a list of posts and record the ones worth uploading
+
+    Each post gains "unique_image_urls": its image_urls minus failures and
+    near-duplicates of images kept earlier in this batch or in earlier runs
+    sharing the cache.
+    """
+    prefetcher = prefetcher or ImagePrefetcher()
+    report = prefetcher.prefetch(url for post in posts for url in post.get('image_urls', []))
+
+    keep = {image['url'] for image in report['images'] if 'sha256' in image and 'duplicate_of' not in image}
+    for post in posts:
+        post['unique_image_urls'] = [url for url in post.get('image_urls', []) if url in keep]
+
+    return report
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+
+    cache_dir = DEFAULT_CACHE_DIR
+    workers = DEFAULT_WORKERS
+    for i, arg in enumerate(sys.argv):
+        if arg == '--cache-dir' and i + 1 < len(sys.argv):
+            cache_dir = sys.argv[i + 1]
+        elif arg == '--workers' and i + 1 < len(sys.argv):
+            workers = int(sys.argv[i + 1])
+
+    # Accepts a buffered JSON response or an NDJSON stream
+    with open(sys.argv[1]) as f:
+        text = f.read()
+    try:
+        posts = json.loads(text)['posts']
+    except (ValueError, KeyError):
+        posts = [record for record in map(json.loads, text.splitlines()) if record.get('type') != 'summary']
+
+    report = prefetch_posts(posts, ImagePrefetcher(cache_dir, workers))
+    del report['images']
+    print(json.dumps(report, indent=2))
@@ -3,42 +3,251 @@ Instagram Scraper using instagrapi
 Handles monitoring user accounts and discovering trending content
 """
 
+import base64
 import json
-import os
 from datetime import datetime
-from typing import List, Dict, Any
-from instagrapi import Client
-from instagrapi.exceptions import LoginRequired, PleaseWaitFewMinutes
+from typing import List, Dict, Any, Iterator
+
+from account_pool import AccountPool, AllAccountsCoolingDown, is_rate_limited
+from gazetteer import Gazetteer
+from profiling import phase, profiled, timings_ms
+from response_format import FORMATS, encode, msgpack_available
+from vendor_index import VendorIndex, ORDERS as VENDOR_ORDERS
+
+# Accounts (and instagrapi, which pulls in pydantic, requests, PIL, ...) are
+# set up on first use so cold starts that fail validation stay cheap
+pool = None
+gazetteer = None
+vendor_index = None
+
+PAGE_SIZE = 27  # Medias requested per page; one page is held in memory at a time
+MAX_PINNED_POSTS = 3  # Pinned posts can be older than the rest of a user's feed
+ACTIONS = ('monitor_user', 'discover_hashtag', 'discover_location', 'top_vendors')
+
+class PartialFetch(Exception):
+    """A page failed after earlier pages were already yielded"""
+
+def get_pool() -> AccountPool:
+    """The account pool, built from the environment on first use"""
+    global pool
+    if pool is None:
+        pool = AccountPool.from_env()
+    return pool
+
+def get_gazetteer() -> Gazetteer:
+    """The location cache and city index, loaded from Supabase on first use"""
+    global gazetteer
+    if gazetteer is None:
+        gazetteer = Gazetteer.from_env()
+    return gazetteer
+
+def get_vendor_index() -> VendorIndex:
+    """The vendor frequency index in Supabase, configured on first use"""
+    global vendor_index
+    if vendor_index is None:
+        vendor_index = VendorIndex.from_env()
+    return vendor_index
+
+def index_vendors(posts: List[Dict[str, Any]], kind: str, source: str):
+    """Fold discovered posts into the vendor index; a failure here never fails the request"""
+    try:
+        with phase('index'):
+            get_vendor_index().record(posts, kind, source)
+    except Exception as e:
+        print(f'Could not update vendor index: {e}')
 
-# Initialize Instagram client
-cl = Client()
-cl.delay_range = [1, 3]  # Random delay between requests
+def tag_city(post: Dict[str, Any], lat, lng):
+    """Set the post's nearest tracked city (see config/discovery-locations.yaml)"""
+    city, _ = get_gazetteer().nearest_city(lat, lng)
+    post['city'] = city['city'] if city else None
+    post['state'] = city['state'] if city else None
 
-def login_instagram():
-    """Login to Instagram using credentials from environment"""
-    username = os.getenv('INSTAGRAM_USERNAME')
-    password = os.getenv('INSTAGRAM_PASSWORD')
+def error_result(error: Exception) -> Dict[str, Any]:
+    if is_rate_limited(error) or isinstance(error, AllAccountsCoolingDown):
+        return {
+            'success': False,
+            'error': 'Rate limited by Instagram. Please wait a few minutes.'
+        }
+    return {
+        'success': False,
+        'error': str(error)
+    }
+
+def extract_image_urls(media, include_video: bool = False) -> List[str]:
+    """Collect image URLs for a photo, carousel or (optionally) video thumbnail"""
+    image_urls = []
+    if media.media_type == 1:  # Photo
+        image_urls.append(media.thumbnail_url)
+    elif media.media_type == 2 and include_video:  # Video
+        image_urls.append(media.thumbnail_url)
+    elif media.media_type == 8:  # Carousel/Album
+        for resource in media.resources:
+            if resource.media_type == 1:
+                image_urls.append(resource.thumbnail_url)
+    return image_urls
+
+def vendor_post(media) -> Dict[str, Any]:
+    """Transform a discovered media into a post record with its author's vendor info"""
+    user = media.user
+    return {
+        'id': media.pk,
+        'username': user.username,
+        'full_name': user.full_name,
+        'is_business': user.is_business,
+        'caption': media.caption_text if media.caption_text else '',
+        'posted_at': media.taken_at.isoformat(),
+        'likes': media.like_count,
+        'comments': media.comment_count,
+        'image_urls': extract_image_urls(media),
+        'engagement_score': media.like_count + media.comment_count
+    }
+
+@phase('lookup')
+def find_location(cl, location_name: str):
+    """Resolve a location name through the gazetteer, searching Instagram only once per name"""
+    location = get_gazetteer().resolve(cl, location_name)
+    if location:
+        print(f'Found location: {location.name} (ID: {location.pk})')
+    return location
 
-    if not username or not password:
-        raise ValueError('Instagram credentials not configured')
+def iter_pages(fetch_page, limit: int) -> Iterator[Any]:
+    """
+    Yield up to limit medias, requesting them page by page
 
+    fetch_page(amount, cursor) returns (medias, next_cursor). Each page is
+    released before the next is requested. A failure on the first page is
+    raised as is; a failure on a later page raises PartialFetch after the
+    medias already yielded, so callers keep what they have.
+    """
+    cursor = None
+    fetched = 0
+
+    while fetched < limit:
+        try:
+            with phase('fetch'):
+                medias, cursor = fetch_page(min(PAGE_SIZE, limit - fetched), cursor)
+        except Exception as e:
+            if fetched == 0:
+                raise
+            raise PartialFetch(f'Stopped after {fetched} posts: {error_result(e)["error"]}') from e
+
+        for media in medias[:limit - fetched]:
+            fetched += 1
+            yield media
+
+        if not medias or not cursor:
+            return
+
+def collect_posts(posts: Iterator[Dict[str, Any]]):
+    """Drain a post iterator, returning (posts, PartialFetch of a failed later page or None)"""
+    collected = []
     try:
-        # Try to load session if exists
-        session_file = '/tmp/instagram_session.json'
-        if os.path.exists(session_file):
-            cl.load_settings(session_file)
-            cl.login(username, password)
-            print('Loaded existing Instagram session')
-        else:
-            # Fresh login
-            cl.login(username, password)
-            cl.dump_settings(session_file)
-            print('Created new Instagram session')
-    except Exception as e:
-        print(f'Login error: {e}')
-        # Try fresh login
-        cl.login(username, password)
-        cl.dump_settings(session_file)
+        for post in posts:
+            collected.append(post)
+    except PartialFetch as e:
+        return collected, e
+    return collected, None
+
+def page_error_of(result) -> Exception:
+    """The PartialFetch at the end of a collect_posts() result, for AccountPool.run"""
+    return result[-1]
+
+def iter_user_posts(cl, username: str, limit: int = 12, last_monitored_at: str = None) -> Iterator[Dict[str, Any]]:
+    """Yield recent posts of a monitored user, newest first"""
+    # Get user ID
+    with phase('lookup'):
+        user_id = cl.user_id_from_username(username)
+
+    # Fetch recent posts
+    medias = iter_pages(
+        lambda amount, cursor: cl.user_medias_paginated_v1(user_id, amount, end_cursor=cursor or ''),
+        limit
+    )
+
+    last_check = None
+    if last_monitored_at:
+        last_check = datetime.fromisoformat(last_monitored_at.replace('Z', '+00:00'))
+    older = 0
+
+    for media in medias:
+        # Skip if post is older than last monitored time
+        if last_check and media.taken_at < last_check:
+            # The feed is newest first, so once we're past any pinned posts
+            # nothing further can be new
+            older += 1
+            if older > MAX_PINNED_POSTS:
+                break
+            continue
+
+        with phase('transform'):
+            post = {
+                'id': media.pk,
+                'caption': media.caption_text if media.caption_text else '',
+                'posted_at': media.taken_at.isoformat(),
+                'likes': media.like_count,
+                'comments': media.comment_count,
+                'image_urls': extract_image_urls(media, include_video=True),
+                'media_type': media.media_type,
+                'is_video': media.media_type == 2
+            }
+        yield post
+
+def iter_hashtag_posts(cl, hashtag: str, limit: int = 50) -> Iterator[Dict[str, Any]]:
+    """Yield top posts for a hashtag in fetch order"""
+    # Fetch top posts for hashtag
+    medias = iter_pages(
+        lambda amount, cursor: cl.hashtag_medias_v1_chunk(hashtag.lstrip('#'), amount, tab_key='top', max_id=cursor),
+        limit
+    )
+
+    for media in medias:
+        with phase('transform'):
+            post = vendor_post(media)
+            post['location'] = media.location.name if media.location else None
+            tag_city(post, getattr(media.location, 'lat', None), getattr(media.location, 'lng', None))
+        yield post
+
+def iter_location_posts(cl, location, limit: int = 50, hashtag_filter: str = None) -> Iterator[Dict[str, Any]]:
+    """Yield top posts for a resolved location, optionally filtered by hashtag"""
+    # Fetch more if filtering by hashtag
+    fetch_amount = limit * 3 if hashtag_filter else limit
+    medias = iter_pages(
+        lambda amount, cursor: cl.location_medias_v1_chunk(location.pk, amount, tab_key='ranked', max_id=cursor),
+        fetch_amount
+    )
+
+    hashtag_clean = hashtag_filter.lower().lstrip('#') if hashtag_filter else None
+    emitted = 0
+
+    for media in medias:
+        # If hashtag filter is specified, check if caption contains it (with or without #)
+        if hashtag_clean:
+            caption_lower = (media.caption_text or '').lower()
+            if f'#{hashtag_clean}' not in caption_lower and hashtag_clean not in caption_lower:
+                continue
+
+        with phase('transform'):
+            post = vendor_post(media)
+            post['location_name'] = location.name
+            post['location_address'] = location.address if hasattr(location, 'address') else None
+            post['location_lat'] = location.lat if hasattr(location, 'lat') else None
+            post['location_lng'] = location.lng if hasattr(location, 'lng') else None
+            tag_city(post, post['location_lat'], post['location_lng'])
+        yield post
+
+        # Stop if we've collected enough filtered posts
+        emitted += 1
+        if emitted >= limit:
+            break
+
+def sort_posts(posts: List[Dict[str, Any]], ranking: str = 'engagement'):
+    """Order posts best first by raw or time-decayed engagement"""
+    if ranking == 'decayed':
+        from scoring import rank_posts  # NumPy is only loaded when asked for
+
+        rank_posts(posts)
+    else:
+        posts.sort(key=lambda x: x['engagement_score'], reverse=True)
 
 def monitor_user(username: str, limit: int = 12, last_monitored_at: str = None) -> Dict[str, Any]:
     """
@@ -53,117 +262,52 @@ def monitor_user(username: str, limit: int = 12, last_monitored_at: str = None)
         Dict with posts and metadata
     """
     try:
-        login_instagram()
-
-        # Get user ID
-        user_id = cl.user_id_from_username(username)
-
-        # Fetch recent posts
-        medias = cl.user_medias(user_id, amount=limit)
-
-        posts = []
-        for media in medias:
-            # Skip if post is older than last monitored time
-            if last_monitored_at:
-                last_check = datetime.fromisoformat(last_monitored_at.replace('Z', '+00:00'))
-                if media.taken_at < last_check:
-                    continue
-
-            # Extract image URLs
-            image_urls = []
-            if media.media_type == 1:  # Photo
-                image_urls.append(media.thumbnail_url)
-            elif media.media_type == 2:  # Video
-                image_urls.append(media.thumbnail_url)
-            elif media.media_type == 8:  # Carousel/Album
-                for resource in media.resources:
-                    if resource.media_type == 1:
-                        image_urls.append(resource.thumbnail_url)
-
-            posts.append({
-                'id': media.pk,
-                'caption': media.caption_text if media.caption_text else '',
-                'posted_at': media.taken_at.isoformat(),
-                'likes': media.like_count,
-                'comments': media.comment_count,
-                'image_urls': image_urls,
-                'media_type': media.media_type,
-                'is_video': media.media_type == 2
-            })
+        posts, page_error = get_pool().run(
+            lambda cl: collect_posts(iter_user_posts(cl, username, limit, last_monitored_at)),
+            partial_error=page_error_of
+        )
 
-        return {
+        result = {
             'success': True,
             'username': username,
             'posts': posts,
             'total_posts': len(posts)
         }
 
-    except PleaseWaitFewMinutes:
-        return {
-            'success': False,
-            'error': 'Rate limited by Instagram. Please wait a few minutes.'
-        }
+        if page_error:
+            result['partial'] = True
+            result['page_error'] = str(page_error)
+
+        return result
+
     except Exception as e:
-        return {
-            'success': False,
-            'error': str(e)
-        }
+        return error_result(e)
 
-def discover_hashtag(hashtag: str, limit: int = 50) -> Dict[str, Any]:
+def discover_hashtag(hashtag: str, limit: int = 50, ranking: str = 'engagement') -> Dict[str, Any]:
     """
     Discover trending posts for a hashtag
 
     Args:
         hashtag: Hashtag to search (without #)
         limit: Number of top posts to fetch
+        ranking: "engagement" (likes + comments) or "decayed" (see scoring.py)
 
     Returns:
         Dict with posts and discovered vendors
     """
     try:
-        login_instagram()
-
         # Remove # if present
         hashtag = hashtag.lstrip('#')
 
-        # Fetch top posts for hashtag
-        medias = cl.hashtag_medias_top(hashtag, amount=limit)
-
-        posts = []
-        discovered_vendors = set()
-
-        for media in medias:
-            # Extract image URLs
-            image_urls = []
-            if media.media_type == 1:  # Photo
-                image_urls.append(media.thumbnail_url)
-            elif media.media_type == 8:  # Carousel/Album
-                for resource in media.resources:
-                    if resource.media_type == 1:
-                        image_urls.append(resource.thumbnail_url)
-
-            # Get user info
-            user = media.user
-            discovered_vendors.add(user.username)
-
-            posts.append({
-                'id': media.pk,
-                'username': user.username,
-                'full_name': user.full_name,
-                'is_business': user.is_business,
-                'caption': media.caption_text if media.caption_text else '',
-                'posted_at': media.taken_at.isoformat(),
-                'likes': media.like_count,
-                'comments': media.comment_count,
-                'image_urls': image_urls,
-                'location': media.location.name if media.location else None,
-                'engagement_score': media.like_count + media.comment_count
-            })
+        posts, page_error = get_pool().run(lambda cl: collect_posts(iter_hashtag_posts(cl, hashtag, limit)),
+                                           partial_error=page_error_of)
+        discovered_vendors = {post['username'] for post in posts}
+        index_vendors(posts, 'hashtag', hashtag)
 
         # Sort by engagement
-        posts.sort(key=lambda x: x['engagement_score'], reverse=True)
+        sort_posts(posts, ranking)
 
-        return {
+        result = {
             'success': True,
             'hashtag': hashtag,
             'posts': posts[:limit],
@@ -171,18 +315,17 @@ def discover_hashtag(hashtag: str, limit: int = 50) -> Dict[str, Any]:
             'discovered_vendors': list(discovered_vendors)
         }
 
-    except PleaseWaitFewMinutes:
-        return {
-            'success': False,
-            'error': 'Rate limited by Instagram. Please wait a few minutes.'
-        }
+        if page_error:
+            result['partial'] = True
+            result['page_error'] = str(page_error)
+
+        return result
+
     except Exception as e:
-        return {
-            'success': False,
-            'error': str(e)
-        }
+        return error_result(e)
 
-def discover_location(location_name: str, limit: int = 50, hashtag_filter: str = None) -> Dict[str, Any]:
+def discover_location(location_name: str, limit: int = 50, hashtag_filter: str = None,
+                      ranking: str = 'engagement') -> Dict[str, Any]:
     """
     Discover posts from a specific location, optionally filtered by hashtags
 
@@ -190,79 +333,31 @@ def discover_location(location_name: str, limit: int = 50, hashtag_filter: str =
         location_name: Location name to search (e.g., "Sydney, Australia")
         limit: Number of top posts to fetch
         hashtag_filter: Optional hashtag to filter results (e.g., "wedding" or "venue")
+        ranking: "engagement" (likes + comments) or "decayed" (see scoring.py)
 
     Returns:
         Dict with posts and discovered vendors
     """
     try:
-        login_instagram()
+        def fetch(cl):
+            location = find_location(cl, location_name)
+            if not location:
+                return None, [], None
+            return (location, *collect_posts(iter_location_posts(cl, location, limit, hashtag_filter)))
 
-        # Search for location
-        locations = cl.location_search(location_name)
+        location, posts, page_error = get_pool().run(fetch, partial_error=page_error_of)
 
-        if not locations:
+        if not location:
             return {
                 'success': False,
                 'error': f'No locations found for "{location_name}"'
             }
 
-        # Use the first (most relevant) location
-        location = locations[0]
-        print(f'Found location: {location.name} (ID: {location.pk})')
-
-        # Fetch top posts from this location (fetch more if filtering by hashtag)
-        fetch_amount = limit * 3 if hashtag_filter else limit
-        medias = cl.location_medias_top(location.pk, amount=fetch_amount)
-
-        posts = []
-        discovered_vendors = set()
-
-        for media in medias:
-            # If hashtag filter is specified, check if caption contains it
-            if hashtag_filter:
-                caption_lower = (media.caption_text or '').lower()
-                hashtag_clean = hashtag_filter.lower().lstrip('#')
-
-                # Check if hashtag exists in caption (with or without #)
-                if f'#{hashtag_clean}' not in caption_lower and hashtag_clean not in caption_lower:
-                    continue
-
-            # Extract image URLs
-            image_urls = []
-            if media.media_type == 1:  # Photo
-                image_urls.append(media.thumbnail_url)
-            elif media.media_type == 8:  # Carousel/Album
-                for resource in media.resources:
-                    if resource.media_type == 1:
-                        image_urls.append(resource.thumbnail_url)
-
-            # Get user info
-            user = media.user
-            discovered_vendors.add(user.username)
-
-            posts.append({
-                'id': media.pk,
-                'username': user.username,
-                'full_name': user.full_name,
-                'is_business': user.is_business,
-                'caption': media.caption_text if media.caption_text else '',
-                'posted_at': media.taken_at.isoformat(),
-                'likes': media.like_count,
-                'comments': media.comment_count,
-                'image_urls': image_urls,
-                'location_name': location.name,
-                'location_address': location.address if hasattr(location, 'address') else None,
-                'location_lat': location.lat if hasattr(location, 'lat') else None,
-                'location_lng': location.lng if hasattr(location, 'lng') else None,
-                'engagement_score': media.like_count + media.comment_count
-            })
-
-            # Stop if we've collected enough filtered posts
-            if len(posts) >= limit:
-                break
+        discovered_vendors = {post['username'] for post in posts}
+        index_vendors(posts, 'location', location.name)
 
         # Sort by engagement
-        posts.sort(key=lambda x: x['engagement_score'], reverse=True)
+        sort_posts(posts, ranking)
 
         result = {
             'success': True,
@@ -276,22 +371,98 @@ def discover_location(location_name: str, limit: int = 50, hashtag_filter: str =
         if hashtag_filter:
             result['hashtag_filter'] = hashtag_filter
 
+        if page_error:
+            result['partial'] = True
+            result['page_error'] = str(page_error)
+
         return result
 
-    except PleaseWaitFewMinutes:
-        return {
-            'success': False,
-            'error': 'Rate limited by Instagram. Please wait a few minutes.'
-        }
     except Exception as e:
-        return {
-            'success': False,
-            'error': str(e)
-        }
+        return error_result(e)
 
+def stream_posts(action: str, body: Dict[str, Any]) -> Iterator[str]:
+    """
+    Stream an action's posts as newline-delimited JSON
+
+    Posts are emitted in fetch order as soon as each one is transformed (no
+    engagement sort), followed by one trailing record with "type": "summary"
+    carrying success, total_posts and discovered_vendors. Errors raised after
+    the response has started are reported in that summary record; a page
+    that fails after others succeeded marks the summary "partial" instead.
+    """
+    summary = {'type': 'summary', 'success': True}
+    total_posts = 0
+    discovered_vendors = {}  # dict keeps first-seen order
+    indexed = []  # Just the fields the vendor index needs, not whole posts
+
+    try:
+        with get_pool().session() as cl:
+            if action == 'monitor_user':
+                summary['username'] = body['username']
+                posts = iter_user_posts(cl, body['username'], body.get('limit', 12), body.get('last_monitored_at'))
+
+            elif action == 'discover_hashtag':
+                summary['hashtag'] = body['hashtag'].lstrip('#')
+                posts = iter_hashtag_posts(cl, body['hashtag'], body.get('limit', 50))
+
+            else:
+                location = find_location(cl, body['location_name'])
+                if not location:
+                    raise LookupError(f'No locations found for "{body["location_name"]}"')
+
+                summary['location_name'] = location.name
+                summary['location_id'] = location.pk
+                if body.get('hashtag_filter'):
+                    summary['hashtag_filter'] = body['hashtag_filter']
+                posts = iter_location_posts(cl, location, body.get('limit', 50), body.get('hashtag_filter'))
+
+            for post in posts:
+                total_posts += 1
+                if 'username' in post:
+                    discovered_vendors[post['username']] = None
+                    indexed.append({field: post[field] for field in
+                                    ('id', 'username', 'full_name', 'is_business', 'engagement_score')})
+                with phase('serialize'):
+                    line = json.dumps(post) + '\n'
+                yield line
+
+    except PartialFetch as e:
+        summary['partial'] = True
+        summary['page_error'] = str(e)
+    except Exception as e:
+        summary.update(error_result(e))
+
+    summary['total_posts'] = total_posts
+    if action != 'monitor_user':
+        summary['discovered_vendors'] = list(discovered_vendors)
+        if indexed:
+            index_vendors(indexed, *(('hashtag', summary['hashtag']) if action == 'discover_hashtag'
+                                     else ('location', summary['location_name'])))
+
+    summary['metadata'] = {'timings_ms': timings_ms()}
+    yield json.dumps(summary) + '\n'
+
+@profiled(labels=ACTIONS)
 def handler(event, context):
     """
     Main handler for Supabase Edge Function
+
+    Pass "stream": true to receive posts as newline-delimited JSON while they
+    are being fetched instead of one JSON document at the end. Discovery
+    actions accept "ranking": "decayed" to order posts by time-decayed
+    engagement instead of raw likes + comments (see scoring.py).
+
+    Successful responses carry metadata.timings_ms with the time spent per
+    phase (login, lookup, fetch, transform, index, serialize).
+
+    Discovery results are folded into the vendor index (see vendor_index.py),
+    which "top_vendors" queries with "limit", "order" ("appearances",
+    "engagement" or "reach") and "business_only".
+
+    Buffered responses accept "format": "columnar" or "msgpack" for a
+    compact encoding of the posts and "gzip": true to compress the body
+    (see response_format.py). Binary bodies are returned base64 encoded
+    with "isBase64Encoded": true.
     """
     try:
         # Parse request body
@@ -309,8 +480,6 @@ def handler(event, context):
                     'body': json.dumps({'success': False, 'error': 'Username required'})
                 }
 
-            result = monitor_user(username, limit, last_monitored_at)
-
         elif action == 'discover_hashtag':
             hashtag = body.get('hashtag')
             limit = body.get('limit', 50)
@@ -321,8 +490,6 @@ def handler(event, context):
                     'body': json.dumps({'success': False, 'error': 'Hashtag required'})
                 }
 
-            result = discover_hashtag(hashtag, limit)
-
         elif action == 'discover_location':
             location_name = body.get('location_name')
             limit = body.get('limit', 50)
@@ -334,21 +501,97 @@ def handler(event, context):
                     'body': json.dumps({'success': False, 'error': 'Location name required'})
                 }
 
-            result = discover_location(location_name, limit, hashtag_filter)
+        elif action == 'top_vendors':
+            order = body.get('order', 'appearances')
+            if order not in VENDOR_ORDERS:
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps({'success': False, 'error': 'Invalid order. Use "appearances", "engagement", or "reach"'})
+                }
+
+            # Answered from the vendor index alone, no Instagram calls
+            vendors = get_vendor_index().top(body.get('limit', 20), order, bool(body.get('business_only')))
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/json'},
+                'body': json.dumps({'success': True, 'order': order, 'vendors': vendors, 'total_vendors': len(vendors)})
+            }
 
         else:
             return {
                 'statusCode': 400,
                 'body': json.dumps({
                     'success': False,
-                    'error': 'Invalid action. Use "monitor_user", "discover_hashtag", or "discover_location"'
+                    'error': 'Invalid action. Use "monitor_user", "discover_hashtag", "discover_location", or "top_vendors"'
                 })
             }
 
+        ranking = body.get('ranking', 'engagement')
+        if ranking not in ('engagement', 'decayed'):
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'success': False, 'error': 'Invalid ranking. Use "engagement" or "decayed"'})
+            }
+
+        response_format = body.get('format', 'json')
+        if response_format not in FORMATS:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'success': False, 'error': 'Invalid format. Use "json", "columnar", or "msgpack"'})
+            }
+
+        if response_format == 'msgpack' and not msgpack_available():
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'success': False, 'error': 'msgpack format is not available on this deployment'})
+            }
+
+        if body.get('stream'):
+            if response_format != 'json' or body.get('gzip'):
+                return {
+                    'statusCode': 400,
+                    'body': json.dumps({'success': False, 'error': 'Streams are always uncompressed NDJSON'})
+                }
+
+            return {
+                'statusCode': 200,
+                'headers': {'Content-Type': 'application/x-ndjson'},
+                'body': stream_posts(action, body)
+            }
+
+        if action == 'monitor_user':
+            result = monitor_user(username, limit, last_monitored_at)
+        elif action == 'discover_hashtag':
+            result = discover_hashtag(hashtag, limit, ranking)
+        else:
+            result = discover_location(location_name, limit, hashtag_filter, ranking)
+
+        if response_format != 'json' or body.get('gzip'):
+            with phase('serialize'):
+                result['metadata'] = {'timings_ms': timings_ms()}  # Excludes the encoding itself
+                payload, headers = encode(result, response_format, bool(body.get('gzip')))
+
+            if isinstance(payload, str):
+                return {'statusCode': 200, 'headers': headers, 'body': payload}
+
+            # Binary bodies (msgpack, gzip) have to be base64 encoded for the gateway
+            return {
+                'statusCode': 200,
+                'headers': headers,
+                'body': base64.b64encode(payload).decode(),
+                'isBase64Encoded': True
+            }
+
+        with phase('serialize'):
+            payload = json.dumps(result)
+
+        # Splice metadata in after serializing so it includes the serialize phase
+        metadata = json.dumps({'timings_ms': timings_ms()})
+
         return {
             'statusCode': 200,
             'headers': {'Content-Type': 'application/json'},
-            'body': json.dumps(result)
+            'body': f'{payload[:-1]}, "metadata": {metadata}}}'
         }
 
     except Exception as e:
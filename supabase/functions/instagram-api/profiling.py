@@ -0,0 +1,129 @@
+"""
+Per-phase timing and opt-in profiling for the instagram-api handler
+
+Every invocation records wall time per phase (login, lookup, fetch,
+transform, index, serialize) which the handler reports in the response metadata.
+
+Set INSTAGRAM_API_PROFILE=1 to also run cProfile and tracemalloc for each
+invocation. Profiles (.prof, readable with pstats or snakeviz) and the top
+allocations (.txt) are written to INSTAGRAM_API_PROFILE_DIR.
+"""
+
+import cProfile
+import functools
+import itertools
+import json
+import os
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Dict
+
+PROFILE_DIR = os.getenv('INSTAGRAM_API_PROFILE_DIR', '/tmp/instagram-api-profiles')
+TOP_ALLOCATIONS = 25
+
+# Timings of the current invocation, phase -> milliseconds
+timings: Dict[str, float] = {}
+
+# Distinguishes profiles written by one process within the same second
+_sequence = itertools.count()
+
+def profiling_enabled() -> bool:
+    return os.getenv('INSTAGRAM_API_PROFILE', '').lower() in ('1', 'true', 'yes')
+
+@contextmanager
+def phase(name: str):
+    """Add the time spent in the block to the named phase of this invocation"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings[name] = timings.get(name, 0.0) + (time.perf_counter() - start) * 1000
+
+def timings_ms() -> Dict[str, float]:
+    return {name: round(ms, 2) for name, ms in timings.items()}
+
+class _Profile:
+    """cProfile + tracemalloc session written out when stopped"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        tracemalloc.start()
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        base = os.path.join(PROFILE_DIR, f'{time.strftime("%Y%m%dT%H%M%S")}-{os.getpid()}-{next(_sequence)}-{self.label}')
+        self.profiler.dump_stats(f'{base}.prof')
+
+        with open(f'{base}.txt', 'w') as f:
+            f.write(f'Peak traced memory: {peak / 1024:.1f} KiB\n')
+            f.write(f'Phases (ms): {timings_ms()}\n\n')
+            f.write(f'Top {TOP_ALLOCATIONS} allocations by line:\n')
+            for stat in snapshot.statistics('lineno')[:TOP_ALLOCATIONS]:
+                f.write(f'{stat}\n')
+        print(f'Profile written to {base}.prof')
+
+def _stop(session: _Profile):
+    """Stop profiling; failing to write a profile never fails the request"""
+    try:
+        session.stop()
+    except Exception as e:
+        print(f'Could not write profile: {e}')
+
+def _stream_then_stop(body, session: _Profile):
+    try:
+        yield from body
+    finally:
+        _stop(session)
+
+def profiled(labels=()):
+    """
+    Wrap a handler so each invocation starts with fresh phase timings and,
+    when INSTAGRAM_API_PROFILE is set, runs under cProfile and tracemalloc.
+    Streaming bodies are profiled until the stream is exhausted.
+
+    Profiles are named after the request's action when it is one of labels
+    (never the raw request value, which ends up in a file path), otherwise
+    "invoke".
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            timings.clear()
+            if not profiling_enabled():
+                return handler(event, context)
+
+            label = 'invoke'
+            try:
+                action = json.loads(event.get('body', '{}')).get('action')
+                if action in labels:
+                    label = action
+            except Exception:
+                pass
+
+            session = _Profile(label)
+            session.start()
+            try:
+                response = handler(event, context)
+            except BaseException:
+                _stop(session)
+                raise
+
+            if isinstance(response.get('body'), (str, bytes)):
+                _stop(session)
+            else:
+                response['body'] = _stream_then_stop(response['body'], session)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,228 @@
+"""
+Compact encodings for instagram-api responses
+
+The default JSON response repeats every key for every post, along with
+the author's vendor fields and, for discover_location, the same location
+fields. The "columnar" format stores posts as one array per field instead:
+
+    {"posts": {"count": 3,
+               "columns": {"id": [...], "likes": [...], "vendor": [0, 1, 0]},
+               "constants": {"location_name": "Sydney", ...},
+               "vendors": {"username": [...], "full_name": [...], "is_business": [...]}},
+     ...}
+
+Each author's username, full_name and is_business are stored once in the
+"vendors" table, and each post refers to its author by index in the
+"vendor" column. A field with the same value on every post goes into
+"constants". The "msgpack" format is the columnar document encoded as
+MessagePack. Any format can also be gzipped.
+
+encode() returns bytes for msgpack and gzipped bodies, which the handler
+sends base64 encoded.
+
+Usage:
+    python response_format.py [--sizes 50,500,5000]   # size and speed benchmark
+"""
+
+import gzip
+import json
+import random
+import sys
+import time
+from typing import List, Dict, Any, Tuple
+
+FORMATS = ('json', 'columnar', 'msgpack')
+VENDOR_FIELDS = ('username', 'full_name', 'is_business')
+GZIP_LEVEL = 6  # Most of the size win of level 9 at a fraction of the time
+
+CONTENT_TYPES = {
+    'json': 'application/json',
+    'columnar': 'application/json',
+    'msgpack': 'application/x-msgpack'
+}
+
+def msgpack_available() -> bool:
+    try:
+        import msgpack  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+def to_columnar(result: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Copy of a response with its posts stored column by column
+
+    Posts missing a field get None in that column, so posts that never had
+    the field come back with it set to None.
+    """
+    posts = result.get('posts')
+    if not isinstance(posts, list):
+        return result
+
+    fields = {}  # dict keeps first-seen order
+    for post in posts:
+        for field in post:
+            fields[field] = None
+
+    table = {'count': len(posts), 'columns': {}, 'constants': {}}
+
+    if posts and all(field in fields for field in VENDOR_FIELDS):
+        vendors = {field: [] for field in VENDOR_FIELDS}
+        vendor_index = {}
+        references = []
+        for post in posts:
+            key = tuple(post.get(field) for field in VENDOR_FIELDS)
+            if key not in vendor_index:
+                vendor_index[key] = len(vendor_index)
+                for field, value in zip(VENDOR_FIELDS, key):
+                    vendors[field].append(value)
+            references.append(vendor_index[key])
+
+        for field in VENDOR_FIELDS:
+            del fields[field]
+        table['columns']['vendor'] = references
+        table['vendors'] = vendors
+
+    for field in fields:
+        column = [post.get(field) for post in posts]
+        if len(posts) > 1 and all(value == column[0] for value in column):
+            table['constants'][field] = column[0]
+        else:
+            table['columns'][field] = column
+
+    return {**result, 'posts': table}
+
+def from_columnar(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of to_columnar, rebuilding posts as a list of dicts"""
+    table = result.get('posts')
+    if not isinstance(table, dict):
+        return result
+
+    columns = dict(table['columns'])
+    references = columns.pop('vendor', None)
+    vendors = table.get('vendors')
+
+    posts = []
+    for i in range(table['count']):
+        post = {field: column[i] for field, column in columns.items()}
+        post.update(table['constants'])
+        if references is not None:
+            for field in VENDOR_FIELDS:
+                post[field] = vendors[field][references[i]]
+        posts.append(post)
+
+    return {**result, 'posts': posts}
+
+def encode(result: Dict[str, Any], response_format: str = 'json', compress: bool = False) -> Tuple[Any, Dict[str, str]]:
+    """
+    Serialize a response, returning (body, headers)
+
+    The body is a str for uncompressed JSON formats and bytes otherwise.
+    """
+    if response_format == 'json':
+        body = json.dumps(result)
+    elif response_format == 'columnar':
+        body = json.dumps(to_columnar(result), separators=(',', ':'))
+    elif response_format == 'msgpack':
+        import msgpack  # Imported on use so JSON responses don't pay for it
+
+        body = msgpack.packb(to_columnar(result))
+    else:
+        raise ValueError(f'Unknown format: {response_format}')
+
+    headers = {'Content-Type': CONTENT_TYPES[response_format]}
+    if compress:
+        if isinstance(body, str):
+            body = body.encode()
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+        headers['Content-Encoding'] = 'gzip'
+
+    return body, headers
+
+def decode(body, response_format: str = 'json', compress: bool = False) -> Dict[str, Any]:
+    """Parse a body produced by encode() back into a response with a list of posts"""
+    if compress:
+        body = gzip.decompress(body)
+
+    if response_format == 'msgpack':
+        import msgpack
+
+        return from_columnar(msgpack.unpackb(body))
+
+    result = json.loads(body)
+    return from_columnar(result) if response_format == 'columnar' else result
+
+def sample_response(n: int, vendors: int = None) -> Dict[str, Any]:
+    """A discover_location-shaped response with n synthetic posts"""
+    rng = random.Random(0)
+    vendors = vendors or max(1, n // 5)
+    posts = []
+    for i in range(n):
+        vendor = rng.randrange(vendors)
+        likes = rng.randrange(5000)
+        comments = rng.randrange(200)
+        posts.append({
+            'id': str(3100000000000000000 + i),
+            'username': f'vendor_{vendor}',
+            'full_name': f'Vendor {vendor} Weddings & Events',
+            'is_business': vendor % 3 != 0,
+            'caption': ' '.join(rng.choice(['#wedding', '#sydneyweddings', 'love', 'our', 'day', 'venue',
+                                            'florals', 'bride', 'groom', 'celebrate'])
+                                for _ in range(rng.randrange(5, 40))),
+            'posted_at': f'2026-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}T10:00:00+00:00',
+            'likes': likes,
+            'comments': comments,
+            'image_urls': [f'https://scontent.cdninstagram.com/v/t51.2885-15/{i}_{j}_n.jpg?stp=dst-jpg_e35'
+                           for j in range(rng.randrange(1, 4))],
+            'engagement_score': likes + comments,
+            'location_name': 'Sydney, Australia',
+            'location_address': None,
+            'location_lat': -33.8688,
+            'location_lng': 151.2093,
+            'city': 'Sydney',
+            'state': 'NSW'
+        })
+    return {
+        'success': True,
+        'location_name': 'Sydney, Australia',
+        'location_id': 212034011,
+        'posts': posts,
+        'total_posts': n,
+        'discovered_vendors': sorted({post['username'] for post in posts})
+    }
+
+def benchmark(sizes: List[int], repeat: int = 5):
+    variants = [(response_format, compress) for response_format in FORMATS for compress in (False, True)]
+    if not msgpack_available():
+        print('msgpack not installed, skipping the msgpack format')
+        variants = [v for v in variants if v[0] != 'msgpack']
+
+    for n in sizes:
+        result = sample_response(n)
+        print(f'\n{n:,} posts')
+        print(f'  {"format":<16} {"bytes":>10} {"vs json":>8} {"encode ms":>10} {"decode ms":>10}')
+
+        baseline = None
+        for response_format, compress in variants:
+            encode_times, decode_times = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                body, _ = encode(result, response_format, compress)
+                encoded = time.perf_counter()
+                decoded = decode(body, response_format, compress)
+                encode_times.append(encoded - start)
+                decode_times.append(time.perf_counter() - encoded)
+
+            assert decoded == result, f'{response_format} did not round-trip'
+            size = len(body.encode() if isinstance(body, str) else body)
+            baseline = baseline or size
+            label = response_format + (' + gzip' if compress else '')
+            print(f'  {label:<16} {size:>10,} {size / baseline:>7.0%} '
+                  f'{min(encode_times) * 1000:>10.2f} {min(decode_times) * 1000:>10.2f}')
+
+if __name__ == '__main__':
+    sizes = [50, 500, 5000]
+    for i, arg in enumerate(sys.argv):
+        if arg == '--sizes' and i + 1 < len(sys.argv):
+            sizes = [int(size) for size in sys.argv[i + 1].split(',')]
+    benchmark(sizes)
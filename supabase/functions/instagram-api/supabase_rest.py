@@ -0,0 +1,55 @@
+"""
+Minimal PostgREST client for the instagram-api tables in Supabase
+
+Uses urllib rather than requests, so importing it stays cheap on cold starts.
+"""
+
+import json
+import os
+import urllib.parse
+import urllib.request
+from typing import Dict, Any
+
+TIMEOUT_SECONDS = 10
+
+class SupabaseRest:
+    """
+    Args:
+        url: Supabase project URL
+        key: Service role key
+    """
+
+    def __init__(self, url: str, key: str):
+        if not url or not key:
+            raise ValueError('Needs SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY')
+        self.url = url.rstrip('/')
+        self.key = key
+
+    @classmethod
+    def from_env(cls) -> 'SupabaseRest':
+        return cls(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_SERVICE_ROLE_KEY'))
+
+    @staticmethod
+    def configured() -> bool:
+        return bool(os.getenv('SUPABASE_URL') and os.getenv('SUPABASE_SERVICE_ROLE_KEY'))
+
+    def request(self, path: str, params: Dict[str, Any] = None, payload: Any = None, prefer: str = None):
+        """GET path, or POST payload to it, returning the decoded JSON response (None when empty)"""
+        url = f'{self.url}/rest/v1/{path}'
+        if params:
+            url += '?' + urllib.parse.urlencode(params)
+        headers = {
+            'apikey': self.key,
+            'Authorization': f'Bearer {self.key}',
+            'Content-Type': 'application/json'
+        }
+        if prefer:
+            headers['Prefer'] = prefer
+        request = urllib.request.Request(
+            url,
+            data=json.dumps(payload).encode() if payload is not None else None,
+            headers=headers,
+            method='POST' if payload is not None else 'GET'
+        )
+        with urllib.request.urlopen(request, timeout=TIMEOUT_SECONDS) as response:
+            return json.loads(response.read() or 'null')
@@ -0,0 +1,220 @@
+"""
+Account rotation and health tracking, against a fake Instagram client
+
+Run from this directory:
+    python -m pytest test_account_pool.py
+"""
+
+import sys
+import types
+
+try:
+    from instagrapi import exceptions
+except ImportError:
+    # The parts of instagrapi.exceptions account_pool looks at, same names and hierarchy
+    exceptions = types.ModuleType('instagrapi.exceptions')
+
+    def define(name, *bases):
+        setattr(exceptions, name, type(name, bases or (Exception,), {'__module__': 'instagrapi.exceptions'}))
+
+    define('ClientError')
+    define('ClientConnectionError', exceptions.ClientError)
+    define('ClientNotFoundError', exceptions.ClientError)
+    define('PrivateError', exceptions.ClientError)
+    define('NotFoundError', exceptions.PrivateError)
+    define('UserNotFound', exceptions.NotFoundError)
+    define('PrivateAccount', exceptions.PrivateError)
+    define('LoginRequired', exceptions.PrivateError)
+    define('PleaseWaitFewMinutes', exceptions.PrivateError)
+    define('BadPassword', exceptions.PrivateError)
+    sys.modules['instagrapi.exceptions'] = exceptions
+
+import pytest
+
+from account_pool import Account, AccountPool, HealthStore, COOLDOWN_SECONDS
+
+class Clock:
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+class FakeClient:
+    fail_login = False
+
+    def get_settings(self):
+        return {}
+
+    def set_settings(self, settings):
+        pass
+
+    def login(self, username, password):
+        if self.fail_login:
+            raise exceptions.BadPassword('bad password')
+
+    def dump_settings(self, path):
+        pass
+
+class MemoryStore:
+    """HealthStore stand-in shared by pools, like the table is shared by cold starts"""
+
+    def __init__(self):
+        self.rows = {}
+
+    def load(self, accounts):
+        for account in accounts:
+            for field, value in self.rows.get(account.username, {}).items():
+                setattr(account, field, value)
+
+    def save(self, account):
+        self.rows[account.username] = {field: getattr(account, field) for field in
+                                       ('cooldown_until', 'last_rate_limited', 'rate_limit_streak',
+                                        'error_rate', 'error_at')}
+
+def make_pool(clock, store=None, n=3):
+    accounts = [Account(f'a{i}', 'password', session_file=f'/nonexistent/a{i}.json') for i in range(n)]
+    return AccountPool(accounts, client_factory=FakeClient, clock=clock, store=store)
+
+def usernames_served(pool, clock, requests, seconds_apart=30):
+    """Which account served each of a run of successful requests"""
+    served = []
+    for _ in range(requests):
+        clock.now += seconds_apart
+        with pool.session() as client:
+            served.append(next(a.username for a in pool.accounts if a.client is client))
+    return served
+
+def rate_limit(pool, username):
+    pool.report_rate_limited(next(a for a in pool.accounts if a.username == username))
+
+def test_rate_limited_account_is_skipped_then_rejoins_rotation():
+    clock = Clock()
+    pool = make_pool(clock)
+    rate_limit(pool, 'a0')
+
+    assert 'a0' not in usernames_served(pool, clock, 10)  # Cooling down, then still less healthy
+
+    clock.now += 60 * 60  # The error decays with time, not only with the account's own successes
+    assert 'a0' in usernames_served(pool, clock, 6)
+
+def test_rate_limit_fails_over_to_next_account():
+    clock = Clock()
+    pool = make_pool(clock, n=2)
+    used = []
+
+    def fetch(client):
+        used.append(client)
+        if len(used) == 1:
+            raise exceptions.PleaseWaitFewMinutes('wait')
+        return 'ok'
+
+    assert pool.run(fetch) == 'ok'
+    assert used[0] is not used[1]
+    assert sum(not h['available'] for h in pool.health()) == 1
+
+@pytest.mark.parametrize('error', [
+    exceptions.UserNotFound('no such user'),
+    exceptions.PrivateAccount('private'),
+    exceptions.ClientNotFoundError('404'),
+    LookupError('Location not found: Atlantis'),
+    ValueError('bad cursor')
+])
+def test_request_errors_do_not_count_against_account(error):
+    clock = Clock()
+    pool = make_pool(clock, n=1)
+
+    def fetch(client):
+        raise error
+
+    with pytest.raises(type(error)):
+        pool.run(fetch)
+    with pytest.raises(type(error)):
+        with pool.session():
+            raise error
+
+    assert pool.health()[0]['error_rate'] == 0
+
+@pytest.mark.parametrize('error', [
+    exceptions.ClientConnectionError('reset'),
+    ConnectionError('reset'),
+    TimeoutError('timed out')
+])
+def test_instagram_and_transport_errors_count_against_account(error):
+    clock = Clock()
+    pool = make_pool(clock, n=1)
+
+    def fetch(client):
+        raise error
+
+    with pytest.raises(type(error)):
+        pool.run(fetch)
+
+    assert pool.health()[0]['error_rate'] > 0
+
+def test_login_failure_in_session_counts_against_account():
+    clock = Clock()
+    pool = make_pool(clock, n=1)
+    FakeClient.fail_login = True
+    try:
+        with pytest.raises(exceptions.BadPassword):
+            with pool.session():
+                pass
+    finally:
+        FakeClient.fail_login = False
+
+    assert pool.health()[0]['error_rate'] > 0
+
+def test_partial_rate_limit_starts_cooldown():
+    clock = Clock()
+    pool = make_pool(clock, n=1)
+
+    class PartialFetch(Exception):
+        pass
+
+    def fetch(client):
+        try:
+            raise exceptions.PleaseWaitFewMinutes('wait')
+        except Exception as e:
+            page_error = PartialFetch('Stopped after 12 posts')
+            page_error.__cause__ = e
+        return ['post'] * 12 + [page_error]
+
+    result = pool.run(fetch, partial_error=lambda result: result[-1])
+    assert len(result) == 13
+    assert pool.health()[0]['cooldown_seconds'] == COOLDOWN_SECONDS
+
+def test_cooldown_survives_cold_start():
+    clock = Clock()
+    store = MemoryStore()
+    rate_limit(make_pool(clock, store), 'a0')
+
+    clock.now += 60
+    cold = make_pool(clock, store)  # A new instance loading the same table
+    health = {h['username']: h for h in cold.health()}
+    assert not health['a0']['available']
+    assert health['a0']['cooldown_seconds'] == COOLDOWN_SECONDS - 60
+    assert cold.acquire().username != 'a0'
+
+def test_health_store_round_trips_through_rest():
+    class FakeRest:
+        def __init__(self):
+            self.rows = {}
+
+        def request(self, path, params=None, payload=None, prefer=None):
+            if payload is None:
+                return list(self.rows.values())
+            for row in payload:
+                self.rows[row['username']] = row
+
+    clock = Clock()
+    store = HealthStore(FakeRest())
+    pool = make_pool(clock, store)
+    rate_limit(pool, 'a1')
+
+    cold = make_pool(clock, store)
+    original, loaded = pool.accounts[1], cold.accounts[1]
+    assert loaded.cooldown_until == pytest.approx(original.cooldown_until)
+    assert loaded.error_rate == pytest.approx(original.error_rate)
+    assert loaded.rate_limit_streak == 1
+    assert cold.accounts[0].error_rate == 0
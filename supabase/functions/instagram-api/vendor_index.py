@@ -0,0 +1,129 @@
+"""
+Persistent index of vendors seen across discovery runs
+
+Every discover_hashtag / discover_location result is folded into the
+instagram_vendor_index tables in Supabase (see the
+create_instagram_vendor_index migration), which keep, per vendor:
+  - appearances (distinct posts) and the total and best engagement of those posts
+  - how many distinct hashtags and locations the vendor was found under
+  - when the vendor was first and last discovered, and whether it is a business
+
+The index lives in Postgres rather than on the function's local disk, so it
+survives cold starts and every instance updates the same one. The
+record_vendor_sightings() function applies a whole result in one
+transaction. Seeing a post again only updates its engagement, so
+re-running the same discovery does not inflate a vendor's counts. Top-N
+queries read an index on each ordering and make no Instagram calls, so the
+monitor scheduler can use them to choose which vendors to poll with
+monitor_user.
+
+Requires SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY.
+
+Usage:
+    python vendor_index.py top [N] [--order appearances|engagement|reach] [--business]
+    python vendor_index.py stats
+"""
+
+import os
+import sys
+from typing import List, Dict, Any, Iterable
+
+from supabase_rest import SupabaseRest
+
+SOURCE_KINDS = ('hashtag', 'location')
+
+# Ordering -> PostgREST order, each backed by an index in the migration
+ORDERS = {
+    'appearances': 'appearances.desc,total_engagement.desc',
+    'engagement': 'total_engagement.desc,appearances.desc',
+    'reach': 'reach.desc,appearances.desc'
+}
+
+class VendorIndex:
+    """
+    Args:
+        url: Supabase project URL
+        key: Service role key
+    """
+
+    def __init__(self, url: str, key: str):
+        self.rest = SupabaseRest(url, key)
+
+    @classmethod
+    def from_env(cls) -> 'VendorIndex':
+        return cls(os.getenv('SUPABASE_URL'), os.getenv('SUPABASE_SERVICE_ROLE_KEY'))
+
+    def record(self, posts: Iterable[Dict[str, Any]], kind: str, source: str) -> int:
+        """
+        Fold a discovery result's posts into the index in one transaction
+
+        Args:
+            posts: Post dicts as returned by discover_hashtag / discover_location
+            kind: "hashtag" or "location"
+            source: The hashtag or location name the posts were found under
+
+        Returns:
+            Number of vendors seen for the first time
+        """
+        if kind not in SOURCE_KINDS:
+            raise ValueError(f'Unknown source kind: {kind}')
+
+        sightings = [
+            {
+                'id': str(post['id']),
+                'username': post['username'],
+                'full_name': post.get('full_name'),
+                'is_business': bool(post.get('is_business')),
+                'engagement': int(post.get('engagement_score') or
+                                  (post.get('likes') or 0) + (post.get('comments') or 0))
+            }
+            for post in posts if post.get('username')
+        ]
+        if not sightings:
+            return 0
+
+        return self.rest.request('rpc/record_vendor_sightings', payload={
+            'source_kind': kind,
+            'source_name': source.lstrip('#'),
+            'posts': sightings
+        })
+
+    def top(self, limit: int = 20, order: str = 'appearances', business_only: bool = False) -> List[Dict[str, Any]]:
+        """The best vendors by appearances, total engagement or reach (distinct hashtags + locations)"""
+        if order not in ORDERS:
+            raise ValueError(f'Invalid order. Use {", ".join(ORDERS)}')
+
+        params = {'select': '*', 'order': ORDERS[order], 'limit': int(limit)}
+        if business_only:
+            params['is_business'] = 'is.true'
+        return self.rest.request('instagram_vendor_index', params)
+
+    def stats(self) -> Dict[str, Any]:
+        rows = self.rest.request('rpc/instagram_vendor_index_stats', payload={})
+        return rows[0] if rows else {'vendors': 0, 'businesses': 0, 'posts': 0, 'last_seen': None}
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command not in ('top', 'stats'):
+        print(__doc__)
+        sys.exit(1)
+
+    index = VendorIndex.from_env()
+
+    if command == 'top':
+        limit = int(sys.argv[2]) if len(sys.argv) > 2 and sys.argv[2].isdigit() else 20
+        order = 'appearances'
+        for i, arg in enumerate(sys.argv):
+            if arg == '--order' and i + 1 < len(sys.argv):
+                order = sys.argv[i + 1]
+
+        for rank, vendor in enumerate(index.top(limit, order, '--business' in sys.argv), 1):
+            business = '🏢' if vendor['is_business'] else '  '
+            print(f'{rank:>3}. {business} @{vendor["username"]:<30} {vendor["appearances"]:>4} posts  '
+                  f'{vendor["total_engagement"]:>9,} engagement  {vendor["hashtags"]} hashtags  '
+                  f'{vendor["locations"]} locations  last seen {vendor["last_seen"][:10]}')
+
+    else:
+        stats = index.stats()
+        print(f'📊 {stats["vendors"]} vendors ({stats["businesses"]} businesses) across {stats["posts"]} posts, '
+              f'last discovery {stats["last_seen"] or "never"}')
@@ -0,0 +1,144 @@
+-- Vendor frequency index built from instagram-api discovery results
+-- (see supabase/functions/instagram-api/vendor_index.py). Kept in Postgres so
+-- every function instance folds into, and ranks from, the same index.
+
+CREATE TABLE IF NOT EXISTS instagram_vendor_index (
+  username TEXT PRIMARY KEY,
+  full_name TEXT,
+  is_business BOOLEAN NOT NULL DEFAULT false,
+
+  -- Distinct posts and their engagement (likes + comments)
+  appearances INTEGER NOT NULL DEFAULT 0,
+  total_engagement BIGINT NOT NULL DEFAULT 0,
+  best_engagement INTEGER NOT NULL DEFAULT 0,
+
+  -- Distinct hashtags / locations the vendor was discovered under
+  hashtags INTEGER NOT NULL DEFAULT 0,
+  locations INTEGER NOT NULL DEFAULT 0,
+  reach INTEGER GENERATED ALWAYS AS (hashtags + locations) STORED,
+
+  first_seen TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+  last_seen TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- One index per top_vendors ordering
+CREATE INDEX IF NOT EXISTS idx_instagram_vendor_index_appearances
+  ON instagram_vendor_index(appearances DESC, total_engagement DESC);
+CREATE INDEX IF NOT EXISTS idx_instagram_vendor_index_engagement
+  ON instagram_vendor_index(total_engagement DESC, appearances DESC);
+CREATE INDEX IF NOT EXISTS idx_instagram_vendor_index_reach
+  ON instagram_vendor_index(reach DESC, appearances DESC);
+
+-- Posts already counted, so re-running a discovery only moves engagement
+CREATE TABLE IF NOT EXISTS instagram_vendor_index_posts (
+  media_id TEXT PRIMARY KEY,
+  username TEXT NOT NULL REFERENCES instagram_vendor_index(username) ON DELETE CASCADE,
+  engagement INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS instagram_vendor_index_sources (
+  username TEXT NOT NULL REFERENCES instagram_vendor_index(username) ON DELETE CASCADE,
+  kind TEXT NOT NULL CHECK (kind IN ('hashtag', 'location')),
+  source TEXT NOT NULL,
+  PRIMARY KEY (username, kind, source)
+);
+
+-- Fold one discovery result into the index, returning how many vendors were new.
+-- posts: [{"id", "username", "full_name", "is_business", "engagement"}, ...]
+CREATE OR REPLACE FUNCTION record_vendor_sightings(source_kind TEXT, source_name TEXT, posts JSONB)
+RETURNS INTEGER
+LANGUAGE plpgsql
+AS $$
+DECLARE
+  post JSONB;
+  vendor TEXT;
+  post_engagement INTEGER;
+  previous INTEGER;
+  new_vendors INTEGER := 0;
+BEGIN
+  IF source_kind NOT IN ('hashtag', 'location') THEN
+    RAISE EXCEPTION 'Unknown source kind: %', source_kind;
+  END IF;
+
+  FOR post IN SELECT * FROM jsonb_array_elements(posts) LOOP
+    vendor := post->>'username';
+    CONTINUE WHEN vendor IS NULL;
+    post_engagement := COALESCE((post->>'engagement')::INTEGER, 0);
+
+    INSERT INTO instagram_vendor_index (username, full_name, is_business)
+    VALUES (vendor, post->>'full_name', COALESCE((post->>'is_business')::BOOLEAN, false))
+    ON CONFLICT (username) DO NOTHING;
+
+    IF FOUND THEN
+      new_vendors := new_vendors + 1;
+    ELSE
+      UPDATE instagram_vendor_index
+      SET full_name = COALESCE(post->>'full_name', full_name),
+          is_business = COALESCE((post->>'is_business')::BOOLEAN, is_business),
+          last_seen = NOW()
+      WHERE username = vendor;
+    END IF;
+
+    INSERT INTO instagram_vendor_index_posts (media_id, username, engagement)
+    VALUES (post->>'id', vendor, post_engagement)
+    ON CONFLICT (media_id) DO NOTHING;
+
+    IF FOUND THEN
+      UPDATE instagram_vendor_index
+      SET appearances = appearances + 1,
+          total_engagement = total_engagement + post_engagement,
+          best_engagement = GREATEST(best_engagement, post_engagement)
+      WHERE username = vendor;
+    ELSE
+      -- Same post seen again: only its engagement has moved
+      SELECT engagement INTO previous
+      FROM instagram_vendor_index_posts
+      WHERE media_id = post->>'id'
+      FOR UPDATE;
+
+      IF previous <> post_engagement THEN
+        UPDATE instagram_vendor_index_posts SET engagement = post_engagement WHERE media_id = post->>'id';
+        UPDATE instagram_vendor_index
+        SET total_engagement = total_engagement + post_engagement - previous,
+            best_engagement = GREATEST(best_engagement, post_engagement)
+        WHERE username = vendor;
+      END IF;
+    END IF;
+
+    INSERT INTO instagram_vendor_index_sources (username, kind, source)
+    VALUES (vendor, source_kind, lower(source_name))
+    ON CONFLICT DO NOTHING;
+
+    IF FOUND THEN
+      UPDATE instagram_vendor_index
+      SET hashtags = hashtags + (source_kind = 'hashtag')::INTEGER,
+          locations = locations + (source_kind = 'location')::INTEGER
+      WHERE username = vendor;
+    END IF;
+  END LOOP;
+
+  RETURN new_vendors;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION instagram_vendor_index_stats()
+RETURNS TABLE (vendors BIGINT, businesses BIGINT, posts BIGINT, last_seen TIMESTAMPTZ)
+LANGUAGE sql
+STABLE
+AS $$
+  SELECT COUNT(*), COUNT(*) FILTER (WHERE is_business), COALESCE(SUM(appearances), 0), MAX(last_seen)
+  FROM instagram_vendor_index;
+$$;
+
+ALTER TABLE instagram_vendor_index ENABLE ROW LEVEL SECURITY;
+ALTER TABLE instagram_vendor_index_posts ENABLE ROW LEVEL SECURITY;
+ALTER TABLE instagram_vendor_index_sources ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role can manage vendor index" ON instagram_vendor_index
+  FOR ALL TO service_role USING (true) WITH CHECK (true);
+CREATE POLICY "Service role can manage vendor index posts" ON instagram_vendor_index_posts
+  FOR ALL TO service_role USING (true) WITH CHECK (true);
+CREATE POLICY "Service role can manage vendor index sources" ON instagram_vendor_index_sources
+  FOR ALL TO service_role USING (true) WITH CHECK (true);
+
+COMMENT ON TABLE instagram_vendor_index IS 'Per-vendor discovery frequency across instagram-api runs, for monitor scheduling';
@@ -0,0 +1,32 @@
+-- Resolved Instagram locations for instagram-api (see
+-- supabase/functions/instagram-api/gazetteer.py). discover_location looks
+-- names up here before calling location_search, and rows with a city are the
+-- tracked cities posts are tagged with.
+
+CREATE TABLE IF NOT EXISTS instagram_gazetteer (
+  -- Normalized query: lower case, commas dropped ("sydney australia")
+  query TEXT PRIMARY KEY,
+
+  -- First location_search result for the query
+  name TEXT NOT NULL,
+  pk BIGINT,
+  address TEXT,
+  lat DOUBLE PRECISION,
+  lng DOUBLE PRECISION,
+
+  -- Set on the one row per city in config/discovery-locations.yaml
+  city TEXT,
+  state TEXT,
+
+  created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_instagram_gazetteer_city
+  ON instagram_gazetteer(city, state) WHERE city IS NOT NULL;
+
+ALTER TABLE instagram_gazetteer ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role can manage gazetteer" ON instagram_gazetteer
+  FOR ALL TO service_role USING (true) WITH CHECK (true);
+
+COMMENT ON TABLE instagram_gazetteer IS 'Instagram location_search results by query, and the tracked cities used for nearest-city tagging';
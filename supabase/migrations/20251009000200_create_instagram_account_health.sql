@@ -0,0 +1,26 @@
+-- Health of each Instagram account used by instagram-api (see
+-- supabase/functions/instagram-api/account_pool.py). Function instances load
+-- it on cold start, so cooldowns and error rates outlive the instance that
+-- recorded them.
+
+CREATE TABLE IF NOT EXISTS instagram_account_health (
+  username TEXT PRIMARY KEY,
+
+  -- Rate limits: no requests until cooldown_until; the cooldown doubles per streak
+  cooldown_until TIMESTAMPTZ,
+  last_rate_limited TIMESTAMPTZ,
+  rate_limit_streak INTEGER NOT NULL DEFAULT 0,
+
+  -- Moving error rate as of error_at; it keeps halving with time after that
+  error_rate DOUBLE PRECISION NOT NULL DEFAULT 0,
+  error_at TIMESTAMPTZ,
+
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+ALTER TABLE instagram_account_health ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY "Service role can manage account health" ON instagram_account_health
+  FOR ALL TO service_role USING (true) WITH CHECK (true);
+
+COMMENT ON TABLE instagram_account_health IS 'Per-account cooldowns and error rates for instagram-api account rotation';